@@ -0,0 +1,155 @@
+from django.conf import settings
+from django.db import IntegrityError, connections, router, transaction
+from foods.cache import invalidate_shopping_lists, invalidate_user_states
+from foods.counters import RECIPE_COUNTERS, change_counters, suspend_counters
+from foods.models import Cart, Recipe
+from foods.signals import suspend_relation_signals
+from rest_framework import serializers
+
+ADDED = 'added'
+EXISTS = 'exists'
+REMOVED = 'removed'
+MISSING = 'missing'
+NOT_FOUND = 'not_found'
+FORBIDDEN = 'forbidden'
+
+
+class BatchSerializer(serializers.Serializer):
+    """Списки id для добавления и удаления."""
+    add = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        default=list,
+        max_length=settings.BATCH_MAX_ITEMS
+    )
+    remove = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        default=list,
+        max_length=settings.BATCH_MAX_ITEMS
+    )
+
+    def validate(self, data):
+        data['add'] = list(dict.fromkeys(data['add']))
+        data['remove'] = list(dict.fromkeys(data['remove']))
+        if not data['add'] and not data['remove']:
+            raise serializers.ValidationError(
+                {'errors': 'Передайте списки add и/или remove.'}
+            )
+        if set(data['add']) & set(data['remove']):
+            raise serializers.ValidationError(
+                {'errors': 'Один id нельзя одновременно добавить и удалить.'}
+            )
+        return data
+
+
+def pair_columns(model, field):
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    return (connection,
+            quote(model._meta.db_table),
+            quote(model._meta.get_field('user').column),
+            quote(model._meta.get_field(field).column))
+
+
+def insert_pairs(model, user, field, pks):
+    """
+    Добавление связей; возвращает id, для которых строка
+    действительно вставлена. В PostgreSQL - одним
+    INSERT ... ON CONFLICT DO NOTHING RETURNING.
+    """
+    if not pks:
+        return set()
+    connection, table, user_column, column = pair_columns(model, field)
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({user_column}, {column}) '
+                f'VALUES {", ".join(["(%s, %s)"] * len(pks))} '
+                f'ON CONFLICT DO NOTHING RETURNING {column}',
+                [value for pk in pks for value in (user.pk, pk)]
+            )
+            return {row[0] for row in cursor.fetchall()}
+    inserted = set()
+    for pk in pks:
+        try:
+            with transaction.atomic(using=connection.alias):
+                model.objects.bulk_create(
+                    [model(user=user, **{f'{field}_id': pk})]
+                )
+        except IntegrityError:
+            continue
+        inserted.add(pk)
+    return inserted
+
+
+def delete_pairs(model, user, field, pks):
+    """
+    Удаление связей; возвращает id, для которых строка
+    действительно удалена. В PostgreSQL - одним DELETE ... RETURNING.
+    """
+    if not pks:
+        return set()
+    connection, table, user_column, column = pair_columns(model, field)
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE {user_column} = %s '
+                f'AND {column} IN ({", ".join(["%s"] * len(pks))}) '
+                f'RETURNING {column}',
+                [user.pk, *pks]
+            )
+            return {row[0] for row in cursor.fetchall()}
+    return {pk for pk in pks
+            if model.objects.filter(user=user, **{field: pk}).delete()[0]}
+
+
+def apply_changes(model, user, added, removed):
+    """
+    Счетчики и кэши после INSERT и DELETE связей, выполненных
+    без сигналов; added и removed - id затронутых строк.
+    """
+    if model in RECIPE_COUNTERS:
+        change_counters(Recipe, added, RECIPE_COUNTERS[model], 1)
+        change_counters(Recipe, removed, RECIPE_COUNTERS[model], -1)
+    if added or removed:
+        invalidate_user_states([user.pk])
+    if model == Cart and (added or removed):
+        invalidate_shopping_lists([user.pk])
+
+
+@transaction.atomic
+def apply_batch(model, user, field, data, targets, forbidden=frozenset()):
+    """
+    Массовое добавление и удаление связей пользователя.
+    targets - id существующих объектов, forbidden - id, которые
+    добавлять нельзя. Возвращает статус по каждому переданному id.
+    Статусы и счетчики берутся из того, что реально сделали
+    INSERT и DELETE, поэтому параллельные запросы их не искажают.
+    """
+    with suspend_counters(), suspend_relation_signals():
+        added = insert_pairs(model, user, field, [
+            pk for pk in data['add'] if pk in targets and pk not in forbidden
+        ])
+        removed = delete_pairs(model, user, field, [
+            pk for pk in data['remove'] if pk in targets
+        ])
+    apply_changes(model, user, added, removed)
+
+    def status(pk, done, done_status, skipped_status):
+        if pk not in targets:
+            return NOT_FOUND
+        if pk in done:
+            return done_status
+        if pk in forbidden and done_status == ADDED:
+            return FORBIDDEN
+        return skipped_status
+
+    return (
+        [{'id': pk, 'action': 'add',
+          'status': status(pk, added, ADDED, EXISTS)}
+         for pk in data['add']]
+        + [{'id': pk, 'action': 'remove',
+            'status': status(pk, removed, REMOVED, MISSING)}
+           for pk in data['remove']]
+    )
@@ -0,0 +1,57 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from foods.cache import get_catalogue_version
+from foods.models import Ingredient, Recipe, Tag
+
+
+def catalogue_etag(model):
+    def etag(request, *args, **kwargs):
+        return f'{model._meta.model_name}-{get_catalogue_version(model)}'
+    return etag
+
+
+def recipe_etag(request, pk=None, **kwargs):
+    """
+    ETag рецепта: время изменения, данные автора, флаги текущего
+    пользователя и версии справочников, которые выводятся в рецепте.
+    """
+    state = Recipe.objects.with_user_flags(request.user).filter(
+        pk=pk
+    ).values_list('updated_at',
+                  'image_renditions_ready',
+                  'is_favorited',
+                  'is_in_shopping_cart',
+                  'author_is_subscribed',
+                  'author__email',
+                  'author__username',
+                  'author__first_name',
+                  'author__last_name').first()
+    if state is None:
+        return None
+    state += (request.user.pk,
+              get_catalogue_version(Tag),
+              get_catalogue_version(Ingredient))
+    return f'recipe-{pk}-{md5(repr(state).encode()).hexdigest()}'
+
+
+def conditional_catalogue(model):
+    """
+    Ответ 304 для неизменившегося справочника.
+    Публичный Cache-Control позволяет кэшировать ответ в nginx.
+    """
+    def decorator(view):
+        view = condition(etag_func=catalogue_etag(model))(view)
+        return cache_control(
+            public=True, max_age=settings.CATALOGUE_CACHE_MAX_AGE
+        )(view)
+    return method_decorator(decorator)
+
+
+conditional_recipe = method_decorator([
+    condition(etag_func=recipe_etag),
+    cache_control(private=True, no_cache=True),
+])
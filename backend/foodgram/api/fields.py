@@ -0,0 +1,89 @@
+import binascii
+from base64 import b64decode
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from PIL import Image
+from rest_framework import serializers
+
+ALLOWED_FORMATS = ('jpeg', 'png', 'gif')
+
+# Размер части base64 строки, кратный 4, чтобы части декодировались
+# независимо друг от друга.
+CHUNK_SIZE = 64 * 1024
+
+
+class StreamingImageField(serializers.ImageField):
+    """
+    Изображение в виде base64 строки или файла multipart запроса.
+    Строка декодируется по частям во временный файл, размер файла
+    и размеры изображения проверяются до его полного чтения.
+    """
+    default_error_messages = {
+        'empty': 'Передан пустой файл.',
+        'invalid_base64': 'Некорректная строка base64.',
+        'invalid_format': 'Допустимые форматы: {formats}.',
+        'too_large': 'Размер файла не должен превышать {max_bytes} байт.',
+        'too_big': ('Размеры изображения не должны превышать '
+                    '{width}x{height} пикселей.'),
+    }
+
+    def to_internal_value(self, data):
+        decoded = isinstance(data, str)
+        if decoded:
+            data = self.decode(data)
+        elif not isinstance(data, UploadedFile):
+            self.fail('invalid')
+        elif data.size > settings.RECIPE_IMAGES['MAX_BYTES']:
+            self.fail('too_large',
+                      max_bytes=settings.RECIPE_IMAGES['MAX_BYTES'])
+        image_format = self.check_image(data)
+        if decoded:
+            data.name = f'{uuid4()}.{image_format}'
+        return super().to_internal_value(data)
+
+    def decode(self, data):
+        """Декодирование строки вида data:image/png;base64,<данные>."""
+        max_bytes = settings.RECIPE_IMAGES['MAX_BYTES']
+        offset = data.find(',') + 1
+        if (len(data) - offset) // 4 * 3 > max_bytes + 2:
+            self.fail('too_large', max_bytes=max_bytes)
+        # Пустое имя Django не принимает, а расширение известно
+        # только после проверки изображения.
+        file = TemporaryUploadedFile(f'{uuid4()}.upload',
+                                     'application/octet-stream', 0, None)
+        try:
+            for start in range(offset, len(data), CHUNK_SIZE):
+                file.write(b64decode(data[start:start + CHUNK_SIZE],
+                                     validate=True))
+        except (binascii.Error, ValueError):
+            file.close()
+            self.fail('invalid_base64')
+        file.size = file.tell()
+        if not file.size or file.size > max_bytes:
+            file.close()
+            self.fail('too_large' if file.size else 'empty',
+                      max_bytes=max_bytes)
+        file.seek(0)
+        return file
+
+    def check_image(self, file):
+        """
+        Проверка формата и размеров по заголовку файла,
+        чтобы не распаковывать слишком большие изображения.
+        """
+        width, height = settings.RECIPE_IMAGES['MAX_DIMENSIONS']
+        try:
+            with Image.open(file) as image:
+                image_format = (image.format or '').lower()
+                size = image.size
+        except (OSError, Image.DecompressionBombError):
+            self.fail('invalid_image')
+        finally:
+            file.seek(0)
+        if image_format not in ALLOWED_FORMATS:
+            self.fail('invalid_format', formats=', '.join(ALLOWED_FORMATS))
+        if size[0] > width or size[1] > height:
+            self.fail('too_big', width=width, height=height)
+        return image_format
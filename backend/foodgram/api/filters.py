@@ -1,19 +1,40 @@
-from django_filters import FilterSet, NumberFilter
-from django_filters.rest_framework import (BooleanFilter,
-                                           ModelMultipleChoiceFilter)
-from foods.models import Cart, Favorite, Recipe, Tag
+from django.db.models import Exists, OuterRef
+from django_filters import (CharFilter, ChoiceFilter, FilterSet,
+                            MultipleChoiceFilter, NumberFilter, OrderingFilter)
+from django_filters.constants import EMPTY_VALUES
+from django_filters.rest_framework import BooleanFilter
+from foods.catalogue import tag_catalogue
+from foods.models import Cart, Favorite, Recipe, RecipeTags
+from foods.search import search_recipes
 from rest_framework import filters
 
 
+class RecipeOrderingFilter(OrderingFilter):
+    """Сортировка с сохранением порядка по дате для равных значений."""
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        ordering = [self.get_ordering_value(param) for param in value]
+        return qs.order_by(*ordering, '-pub_date', '-pk')
+
+
+def tag_choices():
+    return [(tag.slug, tag.slug) for tag in tag_catalogue.all()]
+
+
 class RecipeFilter(FilterSet):
     author__id = NumberFilter()
     is_favorited = BooleanFilter(field_name='is_favorited',
                                  method='filter_is_favorited')
     is_in_shopping_cart = BooleanFilter(field_name='is_in_shopping_cart',
                                         method='filter_is_in_shopping_cart')
-    tags = ModelMultipleChoiceFilter(field_name='tags__slug',
-                                     to_field_name='slug',
-                                     queryset=Tag.objects.all())
+    tags = MultipleChoiceFilter(choices=tag_choices, method='filter_tags')
+    tags_mode = ChoiceFilter(choices=(('any', 'any'), ('all', 'all')),
+                             method='filter_tags_mode')
+    search = CharFilter(method='filter_search')
+    ordering = RecipeOrderingFilter(fields=(('favorites_count', 'popular'),
+                                            ('pub_date', 'pub_date')))
 
     class Meta:
         model = Recipe
@@ -33,6 +54,33 @@ class RecipeFilter(FilterSet):
         recipes = Cart.objects.filter(user=user).values('recipe')
         return queryset.filter(id__in=recipes)
 
+    def filter_tags(self, queryset, name, slugs):
+        """
+        Рецепты с любым из тегов либо, при tags_mode=all, со всеми.
+        Условие строится через EXISTS, поэтому рецепты не повторяются.
+        """
+        tags = tag_catalogue.lookup('slug', self.request)
+        ids = [tags[slug].id for slug in slugs]
+        if self.form.cleaned_data.get('tags_mode') == 'all':
+            groups = [[tag_id] for tag_id in ids]
+        else:
+            groups = [ids]
+        for number, group in enumerate(groups):
+            annotation = f'has_tags_{number}'
+            queryset = queryset.annotate(**{annotation: Exists(
+                RecipeTags.objects.filter(recipe_id=OuterRef('pk'),
+                                          tag_id__in=group)
+            )}).filter(**{annotation: True})
+        return queryset
+
+    def filter_tags_mode(self, queryset, name, value):
+        """Режим учитывается в filter_tags."""
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Поиск по названию, описанию и ингредиентам."""
+        return search_recipes(queryset, value)
+
 
 class CustomSearchFilter(filters.SearchFilter):
     search_param = 'name'
@@ -0,0 +1,421 @@
+import base64
+import csv
+import io
+import json
+import random
+import time
+
+import django
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer, orjson
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from foods.counters import recount
+from foods.importer import DATA_DIR, chunks
+from foods.models import (Cart, Favorite, Ingredient, Recipe,
+                          RecipeIngredients, RecipeTags, Tag)
+from rest_framework.authtoken.models import Token
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from users.models import Follow
+
+User = get_user_model()
+
+USER_PREFIX = 'bench_user_'
+BATCH_SIZE = 5000
+
+
+def bulk_insert(model, objects):
+    for chunk in chunks(objects, BATCH_SIZE):
+        model.objects.bulk_create(chunk)
+
+
+def percentile(values, percent):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(int(round(percent / 100 * len(ordered))), 1)
+    return ordered[rank - 1]
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный замер эндпоинтов API на синтетических данных: '
+            'задержка p50/p95, число запросов к БД и размер ответа в JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--tags-per-recipe', type=int, default=2)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--cart-per-user', type=int, default=5)
+        parser.add_argument('--follows-per-user', type=int, default=10)
+        parser.add_argument('--ingredients-file',
+                            default=str(DATA_DIR / 'ingredients.csv'))
+        parser.add_argument('--tags-file',
+                            default=str(DATA_DIR / 'tags.csv'))
+        parser.add_argument('--requests', type=int, default=20,
+                            help='Число замеров на каждый эндпоинт.')
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--render-page-sizes', type=int, nargs='+',
+                            default=[10, 100],
+                            help='Размеры страниц рецептов для сравнения '
+                                 'рендереров JSON.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output',
+                            help='Файл для JSON с результатами.')
+        parser.add_argument('--keep', action='store_true',
+                            help='Не откатывать сгенерированные данные.')
+
+    def handle(self, **options):
+        self.options = options
+        self.random = random.Random(options['seed'])
+        with transaction.atomic():
+            started = time.perf_counter()
+            dataset = self.seed()
+            seed_time = time.perf_counter() - started
+            cache.clear()
+            results = self.measure(dataset)
+            cache.clear()
+            renderers = self.measure_renderers(dataset)
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+        report = {
+            'meta': {
+                'database': connection.vendor,
+                'django': django.get_version(),
+                'seed': options['seed'],
+                'requests': options['requests'],
+                'page_size': options['page_size'],
+                'orjson': orjson is not None,
+                'seed_seconds': round(seed_time, 3),
+                'dataset': {
+                    'users': options['users'],
+                    'recipes': options['recipes'],
+                    'ingredients': len(dataset['ingredients']),
+                    'tags': len(dataset['tags']),
+                    'ingredients_per_recipe':
+                        options['ingredients_per_recipe'],
+                    'favorites_per_user': options['favorites_per_user'],
+                    'cart_per_user': options['cart_per_user'],
+                    'follows_per_user': options['follows_per_user'],
+                },
+            },
+            'results': results,
+            'renderers': renderers,
+        }
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='UTF-8') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+
+    def seed(self):
+        """Генерация синтетического набора данных."""
+        options = self.options
+        rnd = self.random
+
+        with open(options['ingredients_file'], encoding='UTF-8') as file:
+            rows = {(row[0], row[1]) for row in csv.reader(file) if row}
+        existing = set(Ingredient.objects.values_list('name',
+                                                      'measurement_unit'))
+        bulk_insert(Ingredient, (
+            Ingredient(name=name, measurement_unit=unit)
+            for name, unit in sorted(rows - existing)
+        ))
+        with open(options['tags_file'], encoding='UTF-8') as file:
+            for row in csv.reader(file):
+                if row:
+                    Tag.objects.get_or_create(
+                        slug=row[2], defaults={'name': row[0],
+                                               'color': row[1]}
+                    )
+        ingredient_ids = list(Ingredient.objects.values_list('id',
+                                                             flat=True))
+        tags = list(Tag.objects.values_list('id', 'slug'))
+        tag_ids = [tag_id for tag_id, _ in tags]
+
+        password = make_password(None)
+        bulk_insert(User, (
+            User(email=f'{USER_PREFIX}{i}@example.com',
+                 username=f'{USER_PREFIX}{i}',
+                 first_name='Имя',
+                 last_name='Фамилия',
+                 password=password)
+            for i in range(options['users'])
+        ))
+        user_ids = list(User.objects.filter(
+            username__startswith=USER_PREFIX
+        ).order_by('pk').values_list('id', flat=True))
+
+        bulk_insert(Recipe, (
+            Recipe(author_id=rnd.choice(user_ids),
+                   name=f'Рецепт {i}',
+                   text='Синтетический рецепт для замеров. ' * 10,
+                   image='recipes/images/benchmark.png',
+                   cooking_time=rnd.randint(1, 180))
+            for i in range(options['recipes'])
+        ))
+        recipes = list(Recipe.objects.filter(
+            author_id__in=user_ids
+        ).order_by('pk').values_list('id', 'author_id'))
+        recipe_ids = [recipe_id for recipe_id, _ in recipes]
+
+        per_recipe = min(options['ingredients_per_recipe'],
+                         len(ingredient_ids))
+        bulk_insert(RecipeIngredients, (
+            RecipeIngredients(recipe_id_id=recipe_id,
+                              ingredient_id_id=ingredient_id,
+                              amount=rnd.randint(1, 500))
+            for recipe_id in recipe_ids
+            for ingredient_id in rnd.sample(ingredient_ids, per_recipe)
+        ))
+        per_recipe = min(options['tags_per_recipe'], len(tag_ids))
+        bulk_insert(RecipeTags, (
+            RecipeTags(recipe_id_id=recipe_id, tag_id_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in rnd.sample(tag_ids, per_recipe)
+        ))
+        for model, per_user in ((Favorite, options['favorites_per_user']),
+                                (Cart, options['cart_per_user'])):
+            per_user = min(per_user, len(recipe_ids))
+            bulk_insert(model, (
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id in user_ids
+                for recipe_id in rnd.sample(recipe_ids, per_user)
+            ))
+        per_user = min(options['follows_per_user'], len(user_ids) - 1)
+        bulk_insert(Follow, (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in rnd.sample(
+                [pk for pk in user_ids if pk != user_id], per_user
+            )
+        ))
+        recount()
+
+        viewer = User.objects.get(pk=user_ids[0])
+        return {
+            'viewer': viewer,
+            'user_ids': user_ids,
+            'recipes': recipes,
+            'ingredients': ingredient_ids,
+            'tags': tags,
+        }
+
+    def endpoints(self, dataset):
+        """
+        Эндпоинты из api/urls.py и users/urls.py.
+        Для каждого возвращается метод и функция построения адреса.
+        """
+        rnd = self.random
+        viewer = dataset['viewer']
+        limit = f"?limit={self.options['page_size']}"
+        recipe_ids = [pk for pk, _ in dataset['recipes']]
+        tags = dataset['tags']
+        own = set(Favorite.objects.filter(
+            user=viewer).values_list('recipe_id', flat=True))
+        own |= set(Cart.objects.filter(
+            user=viewer).values_list('recipe_id', flat=True))
+        toggle_recipes = [
+            pk for pk, author_id in dataset['recipes']
+            if author_id != viewer.pk and pk not in own
+        ]
+        followed = set(Follow.objects.filter(
+            user=viewer).values_list('author_id', flat=True))
+        toggle_authors = [pk for pk in dataset['user_ids']
+                          if pk != viewer.pk and pk not in followed]
+        ingredient = Ingredient.objects.order_by('?').first()
+        prefix = ingredient.name[:2] if ingredient else ''
+
+        def recipe_url(name):
+            return lambda: reverse(name, args=[rnd.choice(recipe_ids)])
+
+        return [
+            ('tags-list', 'get', lambda: reverse('tags-list')),
+            ('tags-detail', 'get',
+             lambda: reverse('tags-detail', args=[rnd.choice(tags)[0]])),
+            ('ingredients-list', 'get', lambda: reverse('ingredients-list')),
+            ('ingredients-list?name', 'get',
+             lambda: f"{reverse('ingredients-list')}?name={prefix}"),
+            ('ingredients-detail', 'get',
+             lambda: reverse('ingredients-detail',
+                             args=[rnd.choice(dataset['ingredients'])])),
+            ('recipes-list', 'get',
+             lambda: reverse('recipes-list') + limit),
+            ('recipes-list?page', 'get',
+             lambda: (f"{reverse('recipes-list')}{limit}"
+                      f"&page={rnd.randint(1, 10)}")),
+            ('recipes-list?tags', 'get',
+             lambda: (f"{reverse('recipes-list')}{limit}"
+                      f"&tags={rnd.choice(tags)[1]}"
+                      f"&tags={rnd.choice(tags)[1]}")),
+            ('recipes-list?author', 'get',
+             lambda: (f"{reverse('recipes-list')}{limit}"
+                      f"&author={rnd.choice(dataset['user_ids'])}")),
+            ('recipes-list?ordering', 'get',
+             lambda: f"{reverse('recipes-list')}{limit}&ordering=-popular"),
+            ('recipes-list?is_favorited', 'get',
+             lambda: f"{reverse('recipes-list')}{limit}&is_favorited=1"),
+            ('recipes-list?is_in_shopping_cart', 'get',
+             lambda: (f"{reverse('recipes-list')}{limit}"
+                      f"&is_in_shopping_cart=1")),
+            ('recipes-detail', 'get', recipe_url('recipes-detail')),
+            ('recipes-download-shopping-cart', 'get',
+             lambda: reverse('recipes-download-shopping-cart')),
+            ('recipes-favorite', 'toggle',
+             lambda: reverse('recipes-favorite',
+                             args=[rnd.choice(toggle_recipes)])),
+            ('recipes-shopping-cart', 'toggle',
+             lambda: reverse('recipes-shopping-cart',
+                             args=[rnd.choice(toggle_recipes)])),
+            ('users-list', 'get', lambda: reverse('users-list') + limit),
+            ('users-detail', 'get',
+             lambda: reverse('users-detail',
+                             args=[rnd.choice(dataset['user_ids'])])),
+            ('users-me', 'get', lambda: reverse('users-me')),
+            ('users-subscriptions', 'get',
+             lambda: (f"{reverse('users-subscriptions')}{limit}"
+                      f"&recipes_limit=3")),
+            ('users-subscribe', 'toggle',
+             lambda: reverse('users-subscribe',
+                             args=[rnd.choice(toggle_authors)])),
+        ]
+
+    def get_client(self, dataset):
+        client = APIClient(SERVER_NAME='localhost')
+        token, _ = Token.objects.get_or_create(user=dataset['viewer'])
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def measure(self, dataset):
+        """
+        Замер задержки, числа запросов и размера ответа.
+        Эндпоинты-переключатели замеряются парой POST и DELETE,
+        чтобы данные возвращались в исходное состояние.
+        Замер идет внутри транзакции, поэтому сброс версий кэша
+        в on_commit не срабатывает: после переключателей кэш
+        очищается явно, чтобы чтения не получали устаревшие данные.
+        """
+        client = self.get_client(dataset)
+        results = {}
+        for name, method, url in self.endpoints(dataset):
+            self.stderr.write(f'{name}...')
+            methods = ['post', 'delete'] if method == 'toggle' else [method]
+            samples = {call: [] for call in methods}
+            # Первый проход прогревает кэши и не учитывается.
+            for _ in range(self.options['requests'] + 1):
+                path = url()
+                for call in methods:
+                    samples[call].append(self.request(client, call, path))
+            for call, measured in samples.items():
+                measured = measured[1:]
+                timings = [sample['ms'] for sample in measured]
+                key = name if method != 'toggle' else f'{name}:{call}'
+                results[key] = {
+                    'method': call.upper(),
+                    'status': sorted({sample['status']
+                                      for sample in measured}),
+                    'p50_ms': round(percentile(timings, 50), 3),
+                    'p95_ms': round(percentile(timings, 95), 3),
+                    'mean_ms': round(sum(timings) / len(timings), 3),
+                    'queries': max(sample['queries'] for sample in measured),
+                    'bytes': max(sample['bytes'] for sample in measured),
+                }
+            if method == 'toggle':
+                cache.clear()
+        return results
+
+    def request(self, client, method, path):
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            response = getattr(client, method)(path)
+            if response.streaming:
+                size = sum(len(part) for part in response.streaming_content)
+            else:
+                size = len(response.content)
+            elapsed = time.perf_counter() - started
+        return {'ms': elapsed * 1000,
+                'status': response.status_code,
+                'queries': len(context.captured_queries),
+                'bytes': size}
+
+    def time_calls(self, func):
+        """Время вызовов в мс, первый вызов не учитывается."""
+        timings = []
+        for _ in range(self.options['requests'] + 1):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings[1:]
+
+    def compare(self, standard, fast):
+        standard = self.time_calls(standard)
+        fast = self.time_calls(fast)
+        return {
+            'json_p50_ms': round(percentile(standard, 50), 3),
+            'json_p95_ms': round(percentile(standard, 95), 3),
+            'fast_p50_ms': round(percentile(fast, 50), 3),
+            'fast_p95_ms': round(percentile(fast, 95), 3),
+            'speedup': round(sum(standard) / max(sum(fast), 1e-9), 2),
+        }
+
+    def measure_renderers(self, dataset):
+        """
+        Сравнение стандартного и быстрого рендерера JSON на страницах
+        рецептов и парсеров на теле запроса создания рецепта.
+        Вывод рендереров сверяется побайтно.
+        """
+        client = self.get_client(dataset)
+        standard, fast = JSONRenderer(), FastJSONRenderer()
+        results = {}
+        for size in self.options['render_page_sizes']:
+            self.stderr.write(f'render recipes-list?limit={size}...')
+            data = client.get(
+                f"{reverse('recipes-list')}?limit={size}"
+            ).data
+            expected = standard.render(data)
+            results[f'render:recipes-list?limit={size}'] = dict(
+                self.compare(lambda: standard.render(data),
+                             lambda: fast.render(data)),
+                bytes=len(expected),
+                identical=fast.render(data) == expected,
+            )
+        self.stderr.write('parse recipes-create...')
+        body = self.recipe_body(dataset)
+        standard, fast = JSONParser(), FastJSONParser()
+        results['parse:recipes-create'] = dict(
+            self.compare(lambda: standard.parse(io.BytesIO(body)),
+                         lambda: fast.parse(io.BytesIO(body))),
+            bytes=len(body),
+            identical=(fast.parse(io.BytesIO(body))
+                       == standard.parse(io.BytesIO(body))),
+        )
+        return results
+
+    def recipe_body(self, dataset):
+        """Тело запроса создания рецепта с изображением около 100 КБ."""
+        rnd = self.random
+        per_recipe = min(self.options['ingredients_per_recipe'],
+                         len(dataset['ingredients']))
+        image = bytes(rnd.getrandbits(8) for _ in range(100 * 1024))
+        return json.dumps({
+            'name': 'Рецепт для замера',
+            'text': 'Синтетический рецепт для замеров. ' * 10,
+            'cooking_time': 30,
+            'tags': [tag_id for tag_id, _ in dataset['tags']],
+            'ingredients': [
+                {'id': ingredient_id, 'amount': rnd.randint(1, 500)}
+                for ingredient_id in rnd.sample(dataset['ingredients'],
+                                                per_recipe)
+            ],
+            'image': ('data:image/png;base64,'
+                      + base64.b64encode(image).decode()),
+        }, ensure_ascii=False).encode()
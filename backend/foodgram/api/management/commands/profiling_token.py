@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from ...profiling import make_token
+
+
+class Command(BaseCommand):
+    help = 'Токен для заголовка X-Profiling-Token'
+
+    def handle(self, **kwargs):
+        self.stdout.write(make_token())
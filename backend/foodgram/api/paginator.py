@@ -1,6 +1,169 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+COUNT_KEY = 'page_count:{}'
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор с приблизительным числом объектов.
+    Для всей таблицы число берется из статистики PostgreSQL,
+    для отфильтрованных наборов точное число кэшируется.
+    """
+
+    @cached_property
+    def count(self):
+        config = settings.PAGINATION
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = self.estimate(queryset)
+            if estimate >= config['ESTIMATE_THRESHOLD']:
+                return estimate
+        key = COUNT_KEY.format(md5(str(queryset.query).encode()).hexdigest())
+        return cache.get_or_set(key, queryset.count,
+                                timeout=config['COUNT_CACHE_TIMEOUT'])
+
+    def estimate(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return -1
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s',
+                           [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        return int(row[0]) if row else -1
 
 
 class CustomPaginator(PageNumberPagination):
+    """
+    Постраничная пагинация с необязательным режимом курсора.
+    С параметром cursor объекты выбираются по ключу сортировки
+    без OFFSET и подсчета общего числа, поле count равно null.
+    """
     page_size = 10
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    cursor_ordering = ('-pub_date', '-pk')
+    invalid_cursor_message = 'Неверный курсор.'
+
+    @property
+    def django_paginator_class(self):
+        if settings.PAGINATION['COUNT'] == 'estimate':
+            return EstimatedCountPaginator
+        return Paginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            self.cursor_mode = False
+            return super().paginate_queryset(queryset, request, view)
+        self.cursor_mode = True
+        self.request = request
+        self.ordering = getattr(view, 'cursor_ordering', self.cursor_ordering)
+        order_by = tuple(queryset.query.order_by)
+        if order_by and order_by != self.ordering:
+            raise ValidationError({
+                'errors': 'Курсор доступен только при сортировке по умолчанию.'
+            })
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(queryset.model)
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(field[1:] if field.startswith('-')
+                             else f'-{field}' for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(ordering, position))
+        page = list(queryset[:page_size + 1])
+        has_more = len(page) > page_size
+        page = page[:page_size]
+        if reverse:
+            page.reverse()
+        self.next_position = self.previous_position = None
+        if page and (has_more or reverse):
+            self.next_position = self.get_position(page[-1])
+        if page and (has_more if reverse else position is not None):
+            self.previous_position = self.get_position(page[0])
+        return page
+
+    def after(self, ordering, position):
+        """Условие для объектов после позиции в заданном порядке."""
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def get_position(self, obj):
+        return [str(getattr(obj, field.lstrip('-')))
+                for field in self.ordering]
+
+    def get_model_field(self, model, field):
+        name = field.lstrip('-')
+        return model._meta.pk if name == 'pk' else model._meta.get_field(name)
+
+    def decode_cursor(self, model):
+        cursor = self.request.query_params[self.cursor_query_param]
+        if not cursor:
+            return None, False
+        try:
+            data = json.loads(urlsafe_b64decode(cursor.encode()))
+            values = data['p']
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = [
+                self.get_model_field(model, field).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+            return position, bool(data.get('r'))
+        except (TypeError, ValueError, KeyError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position, reverse):
+        data = {'p': position}
+        if reverse:
+            data['r'] = 1
+        cursor = urlsafe_b64encode(json.dumps(data).encode()).decode()
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('count', None),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, False)
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, True)
@@ -0,0 +1,81 @@
+import codecs
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.utils import json
+
+from .renderers import FastJSONRenderer, orjson
+
+LARGE_NUMBER = 2 ** 63
+
+
+class RequestTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Слишком большой запрос.'
+    default_code = 'request_too_large'
+
+
+def has_large_numbers(data):
+    """
+    orjson читает целые числа больше 64 бит как float,
+    такие данные нужно разобрать стандартным модулем.
+    """
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+        elif isinstance(value, float) and abs(value) >= LARGE_NUMBER:
+            return True
+    return False
+
+
+class FastJSONParser(JSONParser):
+    """
+    Разбор JSON через orjson, если библиотека установлена.
+    Тело в UTF-8 разбирается целиком. При ошибке и при очень больших
+    числах разбор повторяется стандартным модулем: он принимает
+    те же данные и дает те же сообщения об ошибках.
+    """
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if (orjson is None or not self.strict
+                or codecs.lookup(encoding).name != 'utf-8'):
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        try:
+            data = orjson.loads(body)
+        except orjson.JSONDecodeError:
+            pass
+        else:
+            if not has_large_numbers(data):
+                return data
+        try:
+            return json.loads(body.decode(encoding),
+                              parse_constant=json.strict_constant)
+        except ValueError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class RecipeJSONParser(FastJSONParser):
+    """
+    JSON с изображением в base64.
+    Запрос больше допустимого размера изображения отклоняется
+    по заголовку Content-Length, до чтения тела.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        max_length = (-(-settings.RECIPE_IMAGES['MAX_BYTES'] // 3) * 4
+                      + settings.DATA_UPLOAD_MAX_MEMORY_SIZE)
+        if length > max_length:
+            raise RequestTooLarge()
+        return super().parse(stream, media_type, parser_context)
@@ -0,0 +1,158 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+SALT = 'api.profiling'
+
+current_profile = ContextVar('current_profile', default=None)
+
+
+def make_token():
+    """Подписанное значение заголовка для включения профилирования."""
+    return signing.dumps('profile', salt=SALT)
+
+
+class Profile:
+    """Метрики одного запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []
+        self.serialize_time = 0
+        self.serialize_depth = 0
+        self.view_started = None
+        self.view_time = None
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обертка выполнения SQL для connection.execute_wrapper."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    def duplicates(self, limit):
+        counter = Counter(sql for sql, _ in self.queries)
+        return [{'sql': sql, 'count': count}
+                for sql, count in counter.most_common(limit)
+                if count > 1]
+
+    def as_dict(self, limit):
+        total = time.perf_counter() - self.started
+        return {
+            'queries': len(self.queries),
+            'sql_ms': round(sum(d for _, d in self.queries) * 1000, 3),
+            'serialize_ms': round(self.serialize_time * 1000, 3),
+            'view_ms': round((self.view_time or total) * 1000, 3),
+            'total_ms': round(total * 1000, 3),
+            'duplicates': self.duplicates(limit),
+        }
+
+
+def timed_data(fget):
+    """
+    Учет времени сериализации в текущем профиле.
+    Вложенные вызовы .data учитываются только один раз.
+    """
+    def data(serializer):
+        profile = current_profile.get()
+        if profile is None:
+            return fget(serializer)
+        profile.serialize_depth += 1
+        started = time.perf_counter()
+        try:
+            return fget(serializer)
+        finally:
+            profile.serialize_depth -= 1
+            if not profile.serialize_depth:
+                profile.serialize_time += time.perf_counter() - started
+    data.profiled = True
+    return property(data)
+
+
+class ProfilingMiddleware:
+    """
+    Профилирование запроса: число и время SQL запросов,
+    повторяющиеся запросы, время сериализации и работы представления.
+    Включается настройкой PROFILING['ENABLED'] для всех запросов
+    либо подписанным заголовком для отдельного запроса.
+    Результат передается в заголовке Server-Timing.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if not getattr(BaseSerializer.data.fget, 'profiled', False):
+            BaseSerializer.data = timed_data(BaseSerializer.data.fget)
+
+    @property
+    def config(self):
+        return settings.PROFILING
+
+    def __call__(self, request):
+        if not self.is_enabled(request):
+            return self.get_response(request)
+        profile = Profile()
+        token = current_profile.set(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        if profile.view_time is None and profile.view_started is not None:
+            profile.view_time = time.perf_counter() - profile.view_started
+        metrics = profile.as_dict(self.config['DUPLICATES'])
+        response['Server-Timing'] = self.server_timing(metrics)
+        if self.config['LOG']:
+            logger.info(json.dumps(
+                dict(metrics, method=request.method, path=request.path,
+                     status=response.status_code),
+                ensure_ascii=False
+            ))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = current_profile.get()
+        if profile is not None:
+            profile.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        """Ответы DRF рендерятся после представления, здесь оно завершено."""
+        profile = current_profile.get()
+        if profile is not None and profile.view_started is not None:
+            profile.view_time = time.perf_counter() - profile.view_started
+        return response
+
+    def is_enabled(self, request):
+        if self.config['ENABLED']:
+            return True
+        token = request.META.get(self.config['HEADER'])
+        if not token:
+            return False
+        try:
+            signing.loads(token, salt=SALT,
+                          max_age=self.config['TOKEN_MAX_AGE'])
+        except signing.BadSignature:
+            return False
+        return True
+
+    def server_timing(self, metrics):
+        duplicated = sum(item['count'] for item in metrics['duplicates'])
+        return ', '.join((
+            f'db;dur={metrics["sql_ms"]};'
+            f'desc="{metrics["queries"]} queries, {duplicated} duplicated"',
+            f'serialize;dur={metrics["serialize_ms"]}',
+            f'view;dur={metrics["view_ms"]}',
+            f'total;dur={metrics["total_ms"]}',
+        ))
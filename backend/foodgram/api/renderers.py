@@ -0,0 +1,74 @@
+import math
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'),
+                   (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+def has_non_finite_floats(data):
+    """
+    orjson записывает NaN и бесконечность как null, а стандартный
+    рендерер на таких данных завершается ошибкой.
+    """
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+        elif isinstance(value, float) and not math.isfinite(value):
+            return True
+    return False
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSON через orjson, если библиотека установлена.
+    Вывод совпадает со стандартным рендерером: кириллица без
+    экранирования, без пробелов, U+2028 и U+2029 экранируются,
+    даты форматируются кодировщиком DRF. Отличается только запись
+    некоторых дробных чисел (1e16 вместо 1e+16), в ответах API
+    таких полей нет. Ответы с отступами, данные, которые orjson
+    не поддерживает, и данные с NaN или бесконечностью передаются
+    стандартному рендереру.
+    """
+    options = (orjson.OPT_PASSTHROUGH_DATETIME
+               | orjson.OPT_PASSTHROUGH_DATACLASS) if orjson else 0
+
+    def __init__(self):
+        super().__init__()
+        self.default = self.encoder_class().default
+
+    def is_supported(self, accepted_media_type, renderer_context):
+        return (orjson is not None and not self.ensure_ascii
+                and self.compact
+                and self.get_indent(accepted_media_type,
+                                    renderer_context) is None)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if not self.is_supported(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.default,
+                               option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        if b'null' in ret and has_non_finite_floats(data):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        for separator, escaped in LINE_SEPARATORS:
+            if separator in ret:
+                ret = ret.replace(separator, escaped)
+        return ret
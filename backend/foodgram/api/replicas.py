@@ -0,0 +1,84 @@
+import random
+from contextvars import ContextVar
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_KEY = 'db_pin:{}'
+
+read_alias = ContextVar('read_alias', default=None)
+
+
+class ReplicaRouter:
+    """
+    Чтение в запросах, отмеченных ReplicaMiddleware, идет с реплики,
+    все остальное, включая любую запись, - с основной БД.
+    """
+
+    def db_for_read(self, model, **hints):
+        return read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    """
+    Безопасные запросы к представлениям с атрибутом replica_reads
+    читают с одной из реплик. После изменяющего запроса клиент
+    на PIN_SECONDS закрепляется за основной БД: cookie для браузера
+    и отметкой в кэше по заголовку авторизации для клиентов с токеном.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @property
+    def config(self):
+        return settings.REPLICAS
+
+    def __call__(self, request):
+        token = read_alias.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            read_alias.reset(token)
+        if request.method not in SAFE_METHODS and self.config['ALIASES']:
+            self.pin(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'cls', None)
+        if (request.method in SAFE_METHODS and self.config['ALIASES']
+                and getattr(view, 'replica_reads', False)
+                and not self.is_pinned(request)):
+            read_alias.set(random.choice(self.config['ALIASES']))
+
+    def pin_key(self, request):
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+        if not authorization:
+            return None
+        return PIN_KEY.format(md5(authorization.encode()).hexdigest())
+
+    def is_pinned(self, request):
+        if self.config['PIN_COOKIE'] in request.COOKIES:
+            return True
+        key = self.pin_key(request)
+        return key is not None and cache.get(key) is not None
+
+    def pin(self, request, response):
+        response.set_cookie(self.config['PIN_COOKIE'], '1',
+                            max_age=self.config['PIN_SECONDS'],
+                            httponly=True, samesite='Lax')
+        key = self.pin_key(request)
+        if key is not None:
+            cache.set(key, True, timeout=self.config['PIN_SECONDS'])
@@ -1,13 +1,21 @@
+from collections import Counter, OrderedDict, defaultdict
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.contrib.auth.models import AnonymousUser
+from django.db import models, transaction
 from drf_extra_fields.fields import Base64ImageField
-from foods.models import (Cart, Favorite, Ingredient, Recipe,
-                          RecipeIngredients, Tag)
+from foods.cache import (get_fragment_namespace, get_recipe_fragments,
+                         get_user_state, invalidate_recipe_shopping_lists,
+                         set_recipe_fragments)
+from foods.catalogue import ingredient_catalogue, tag_catalogue
+from foods.images import rendition_urls, schedule_renditions
+from foods.models import Ingredient, Recipe, RecipeIngredients, RecipeTags, Tag
+from foods.search import update_search_vectors
+from foods.signals import suspend_relation_signals
 from rest_framework import serializers
-from users.models import Follow
 from users.serializers import CustomUserSerializer
 
-from .validators import check_unique_and_exists
+from .fields import StreamingImageField
 
 User = get_user_model()
 
@@ -24,26 +32,41 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
-    """Вложенный сериализатор модели Ingredient для GET запросов рецепта."""
-    amount = serializers.SerializerMethodField()
+    """
+    Вложенный сериализатор ингредиентов с количеством для GET запросов.
+    Название и единица измерения берутся из справочника в памяти.
+    """
+    id = serializers.ReadOnlyField(source='ingredient_id_id')
+    name = serializers.SerializerMethodField()
+    measurement_unit = serializers.SerializerMethodField()
 
     class Meta:
-        model = Ingredient
+        model = RecipeIngredients
         fields = ('id',
                   'name',
                   'measurement_unit',
                   'amount'
                   )
 
-    def get_amount(self, obj):
-        recipe = self.context.get('recipe')
-        return (recipe.ingredients_num.
-                filter(ingredient_id__exact=obj.id).first().amount)
+    def get_ingredient(self, obj):
+        record = ingredient_catalogue.get(obj.ingredient_id_id,
+                                          self.context.get('request'))
+        return record or obj.ingredient_id
+
+    def get_name(self, obj):
+        return self.get_ingredient(obj).name
+
+    def get_measurement_unit(self, obj):
+        return self.get_ingredient(obj).measurement_unit
 
 
 class RecipeIngredientPostSerializer(serializers.ModelSerializer):
-    """Вложенный сериализатор ингредиентов для POST запросов рецептов."""
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    """
+    Вложенный сериализатор ингредиентов для POST запросов рецептов.
+    Наличие ингредиентов проверяется сразу для всего списка
+    в RecipeWriteSerializer.validate_ingredients.
+    """
+    id = serializers.IntegerField(min_value=1)
 
     class Meta:
         model = RecipeIngredients
@@ -62,13 +85,40 @@ class TagSerializer(serializers.ModelSerializer):
                   )
 
 
-class RecipeGetSerializer(serializers.ModelSerializer):
-    """Сериализатор для GET запросов на модель Recipe."""
-    ingredients = serializers.SerializerMethodField()
+class RecipeImagesMixin(serializers.Serializer):
+    """Адреса уменьшенных копий изображения рецепта."""
+    images = serializers.SerializerMethodField()
+
+    def get_images(self, obj):
+        request = self.context.get('request')
+        return {
+            rendition: (request.build_absolute_uri(url)
+                        if url and request else url)
+            for rendition, url in rendition_urls(obj).items()
+        }
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Список рецептов: фрагменты всей страницы читаются из кэша разом."""
+
+    def to_representation(self, data):
+        recipes = data.all() if isinstance(data, models.Manager) else data
+        return self.child.represent(list(recipes))
+
+
+class RecipeGetSerializer(RecipeImagesMixin, serializers.ModelSerializer):
+    """
+    Сериализатор для GET запросов на модель Recipe.
+    Общие для всех пользователей данные рецепта кэшируются,
+    флаги текущего пользователя подставляются при каждом ответе.
+    """
+    ingredients = RecipeIngredientSerializer(source='ingredients_num',
+                                             many=True,
+                                             read_only=True)
     author = CustomUserSerializer(read_only=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    tags = TagSerializer(many=True, read_only=True)
+    tags = serializers.SerializerMethodField()
     image = Base64ImageField()
 
     class Meta:
@@ -81,43 +131,92 @@ class RecipeGetSerializer(serializers.ModelSerializer):
                   'is_in_shopping_cart',
                   'name',
                   'image',
+                  'images',
                   'text',
                   'cooking_time'
                   )
+        list_serializer_class = RecipeListSerializer
+
+    def get_tags(self, obj):
+        """Теги рецепта из справочника в памяти по id из связующей модели."""
+        tags = tag_catalogue.get_many(
+            sorted(row.tag_id_id for row in obj.tags_list.all()),
+            self.context.get('request')
+        )
+        return TagSerializer(tags.values(), many=True).data
 
     def get_is_favorited(self, obj):
-        request_user = self.context.get('request').user
-        if type(request_user) == AnonymousUser:
-            return False
-        return (request_user.favorites.
-                filter(recipe__exact=obj).exists())
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        return obj.pk in get_user_state(self.context.get('request')).favorites
 
     def get_is_in_shopping_cart(self, obj):
-        request_user = self.context.get('request').user
-        if type(request_user) == AnonymousUser:
-            return False
-        return request_user.cart.filter(recipe__exact=obj).exists()
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        return obj.pk in get_user_state(self.context.get('request')).cart
+
+    def get_author_is_subscribed(self, obj):
+        if hasattr(obj, 'author_is_subscribed'):
+            return obj.author_is_subscribed
+        return (obj.author_id
+                in get_user_state(self.context.get('request')).following)
+
+    def to_representation(self, instance):
+        return self.represent([instance])[0]
 
-    def get_ingredients(self, obj):
-        ingredients = obj.ingredients
+    def represent(self, recipes):
         """
-        Добавление в контекст объекта Recipe для последующего
-        получения поля amount.
+        Фрагменты из кэша по id и версии рецепта. Для отсутствующих
+        рецептов связи загружаются и фрагменты сохраняются.
         """
-        serializer_context = {'request': self.context.get('request'),
-                              'recipe': obj}
-        serializer = RecipeIngredientSerializer(ingredients,
-                                                context=serializer_context,
-                                                many=True)
-        return serializer.data
+        request = self.context.get('request')
+        use_cache = settings.RECIPE_FRAGMENTS['CACHE']
+        fragments = {}
+        if use_cache:
+            namespace = get_fragment_namespace(
+                request.build_absolute_uri('/') if request else None
+            )
+            fragments = get_recipe_fragments(recipes, namespace)
+        missing = [recipe for recipe in recipes
+                   if recipe.pk not in fragments]
+        if missing:
+            models.prefetch_related_objects(
+                missing, 'author', *Recipe.objects.relation_prefetches()
+            )
+            for recipe in missing:
+                fragments[recipe.pk] = self.render_fragment(recipe)
+            if use_cache:
+                set_recipe_fragments(missing, fragments, namespace)
+        return [self.add_user_flags(fragments[recipe.pk], recipe)
+                for recipe in recipes]
+
+    def render_fragment(self, instance):
+        """Данные рецепта без флагов пользователя."""
+        data = super().to_representation(instance)
+        data['is_favorited'] = data['is_in_shopping_cart'] = None
+        data['author']['is_subscribed'] = None
+        return data
+
+    def add_user_flags(self, fragment, instance):
+        data = OrderedDict(fragment)
+        data['author'] = OrderedDict(data['author'])
+        data['author']['is_subscribed'] = self.get_author_is_subscribed(
+            instance
+        )
+        data['is_favorited'] = self.get_is_favorited(instance)
+        data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(instance)
+        return data
+
+
+def format_ids(ids):
+    return ', '.join(map(str, ids))
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
     """Сериализатор для POST и PATCH запросов рецептов."""
     ingredients = RecipeIngredientPostSerializer(many=True, write_only=True)
-    image = Base64ImageField()
-    tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(),
-                                              many=True)
+    image = StreamingImageField()
+    tags = serializers.ListField(child=serializers.IntegerField(min_value=1))
 
     class Meta:
         model = Recipe
@@ -129,26 +228,139 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
                   'cooking_time'
                   )
 
+    def validate_name(self, value):
+        recipes = Recipe.objects.filter(author=self.context['request'].user,
+                                        name=value)
+        if self.instance:
+            recipes = recipes.exclude(pk=self.instance.pk)
+        if recipes.exists():
+            raise serializers.ValidationError(
+                'У вас уже есть рецепт с таким названием.'
+            )
+        return value
+
+    def validate_ingredients(self, value):
+        """Проверка всех ингредиентов одним обращением к справочнику."""
+        ids = [item['id'] for item in value]
+        duplicates = sorted(pk for pk, count in Counter(ids).items()
+                            if count > 1)
+        ingredients = ingredient_catalogue.instances(
+            ids, self.context.get('request')
+        )
+        missing = [pk for pk in dict.fromkeys(ids) if pk not in ingredients]
+        errors = []
+        if duplicates:
+            errors.append(
+                f'Ингредиенты указаны повторно: {format_ids(duplicates)}.'
+            )
+        if missing:
+            errors.append(f'Ингредиенты не найдены: {format_ids(missing)}.')
+        if errors:
+            raise serializers.ValidationError(errors)
+        for item in value:
+            item['id'] = ingredients[item['id']]
+        return value
+
+    def validate_tags(self, value):
+        """Проверка всех тегов по справочнику в памяти."""
+        ids = list(dict.fromkeys(value))
+        tags = tag_catalogue.instances(ids, self.context.get('request'))
+        missing = [pk for pk in ids if pk not in tags]
+        if missing:
+            raise serializers.ValidationError(
+                f'Теги не найдены: {format_ids(missing)}.'
+            )
+        return [tags[pk] for pk in ids]
+
+    def set_tags(self, instance, tags, create):
+        """Добавление и удаление только изменившихся тегов."""
+        current = (set() if create else set(
+            RecipeTags.objects.filter(recipe_id=instance).values_list(
+                'tag_id', flat=True)
+        ))
+        submitted = {tag.pk for tag in tags}
+        RecipeTags.objects.bulk_create(
+            RecipeTags(recipe_id=instance, tag_id=tag)
+            for tag in tags if tag.pk not in current
+        )
+        removed = current - submitted
+        if removed:
+            RecipeTags.objects.filter(recipe_id=instance,
+                                      tag_id__in=removed).delete()
+        self.tag_rows = [RecipeTags(recipe_id=instance, tag_id=tag)
+                         for tag in tags]
+        return current != submitted
+
+    def set_ingredients(self, instance, ingredients, create):
+        """
+        Сравнение переданных ингредиентов с сохраненными:
+        добавляются, изменяются и удаляются только отличающиеся строки.
+        """
+        current = {} if create else {
+            ingredient_id: (pk, amount)
+            for ingredient_id, pk, amount in
+            RecipeIngredients.objects.filter(recipe_id=instance).values_list(
+                'ingredient_id', 'pk', 'amount')
+        }
+        rows = {}
+        for ingredient in ingredients:
+            row = RecipeIngredients(recipe_id=instance,
+                                    ingredient_id=ingredient['id'],
+                                    amount=ingredient['amount'])
+            if ingredient['id'].pk in current:
+                row.pk = current[ingredient['id'].pk][0]
+            rows[ingredient['id'].pk] = row
+        created = [row for row in rows.values() if row.pk is None]
+        changed = [row for key, row in rows.items()
+                   if key in current and current[key][1] != row.amount]
+        removed = [pk for key, (pk, _) in current.items() if key not in rows]
+        RecipeIngredients.objects.bulk_create(created)
+        if changed:
+            RecipeIngredients.objects.bulk_update(changed, ['amount'])
+        if removed:
+            RecipeIngredients.objects.filter(pk__in=removed).delete()
+        self.ingredient_rows = list(rows.values())
+        return bool(created or changed or removed)
+
+    @transaction.atomic
     def create_or_update_recipe(self, validated_data,
                                 create: bool, instance=None):
-        """Создание или обновление рецепта."""
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        if create and not instance:
+        """
+        Создание или обновление рецепта.
+        При обновлении изменяются только отличающиеся поля и связи,
+        без изменений рецепт не сохраняется и кэши не сбрасываются.
+        """
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        if 'image' in validated_data:
+            validated_data['image_renditions_ready'] = False
+        if create:
             instance = Recipe.objects.create(**validated_data)
+            changed = False
         else:
-            """Обновление полей рецепта и удаление связей с ингредиентами."""
+            changed = any(getattr(instance, key) != value
+                          for key, value in validated_data.items())
             for key, value in validated_data.items():
                 setattr(instance, key, value)
-            (RecipeIngredients.objects.
-             filter(recipe_id__exact=instance).delete())
-        instance.tags.set(tags)
-        instance.save()
-        objects = (RecipeIngredients(recipe_id=instance,
-                                     ingredient_id=ingredient.get('id'),
-                                     amount=ingredient.get('amount'))
-                   for ingredient in ingredients)
-        RecipeIngredients.objects.bulk_create(objects)
+        with suspend_relation_signals():
+            if tags is not None:
+                changed |= self.set_tags(instance, tags, create)
+            if ingredients is not None:
+                ingredients_changed = self.set_ingredients(
+                    instance, ingredients, create
+                )
+                if ingredients_changed and not create:
+                    invalidate_recipe_shopping_lists(instance.pk)
+                changed |= ingredients_changed
+        if create:
+            update_search_vectors(Recipe.objects.filter(pk=instance.pk))
+        elif changed:
+            instance.save()
+        if 'image' in validated_data:
+            # Временный файл изображения уже перенесен в хранилище.
+            validated_data['image'].close()
+        if not instance.image_renditions_ready:
+            schedule_renditions(instance)
         return instance
 
     def create(self, validated_data):
@@ -159,12 +371,21 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
                                             False, instance=instance)
 
     def to_representation(self, instance):
-        instance = Recipe.objects.get(pk=instance.pk)
+        """
+        Ответ строится из сохраненного объекта: переданные теги
+        и ингредиенты подставляются вместо повторной загрузки.
+        """
+        prefetched = {}
+        if getattr(self, 'tag_rows', None) is not None:
+            prefetched['tags_list'] = self.tag_rows
+        if getattr(self, 'ingredient_rows', None) is not None:
+            prefetched['ingredients_num'] = self.ingredient_rows
+        instance._prefetched_objects_cache = prefetched
         return RecipeGetSerializer(instance,
                                    context=self.context).data
 
 
-class RecipeShortSerialzier(serializers.ModelSerializer):
+class RecipeShortSerialzier(RecipeImagesMixin, serializers.ModelSerializer):
     """Сериализатор для отображения краткой информации о рецепте."""
 
     class Meta:
@@ -172,14 +393,29 @@ class RecipeShortSerialzier(serializers.ModelSerializer):
         fields = ('id',
                   'name',
                   'image',
+                  'images',
                   'cooking_time'
                   )
 
 
+class SubscriptionParamsSerializer(serializers.Serializer):
+    """Параметры запроса для списка подписок."""
+    recipes_limit = serializers.IntegerField(min_value=0, required=False)
+
+
+def get_recipes_limit(request):
+    params = SubscriptionParamsSerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    return params.validated_data.get('recipes_limit')
+
+
 class FollowReturnSerializer(CustomUserSerializer):
-    """Сериализатор для подписок."""
+    """
+    Сериализатор для подписок.
+    Рецепты авторов передаются в контексте, см. get_context.
+    """
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -193,65 +429,25 @@ class FollowReturnSerializer(CustomUserSerializer):
                   'recipes_count'
                   )
 
-    def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes = Recipe.objects.filter(author=obj)
-        limit = request.query_params.get('recipes_limit')
-        if limit:
-            recipes = recipes[:int(limit)]
+    @staticmethod
+    def get_context(request, authors, limit):
+        """Загрузка последних рецептов всех авторов одним запросом."""
+        recipes = defaultdict(list)
+        queryset = Recipe.objects.filter(
+            author__in=authors
+        ).only('id',
+               'name',
+               'image',
+               'cooking_time',
+               'image_renditions_ready',
+               'author_id',
+               'pub_date').latest_per_author(limit)
+        for recipe in queryset:
+            recipes[recipe.author_id].append(recipe)
+        return {'request': request, 'recipes': recipes}
 
-        serializer = RecipeShortSerialzier(recipes,
+    def get_recipes(self, obj):
+        serializer = RecipeShortSerialzier(self.context['recipes'][obj.pk],
                                            many=True,
-                                           context={'request': request})
+                                           context=self.context)
         return serializer.data
-
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
-
-
-class FollowSerializer(serializers.ModelSerializer):
-
-    class Meta:
-        model = Follow
-        fields = ('user',
-                  'author')
-        validators = []
-
-    def validate(self, data):
-        return check_unique_and_exists(self.context, Follow, data)
-
-    def to_representation(self, instance):
-        return FollowReturnSerializer(instance.author,
-                                      context=self.context).data
-
-
-class FavoriteSerializer(serializers.ModelSerializer):
-
-    class Meta:
-        model = Favorite
-        fields = ('user',
-                  'recipe')
-        validators = []
-
-    def validate(self, data):
-        return check_unique_and_exists(self.context, Favorite, data)
-
-    def to_representation(self, instance):
-        return RecipeShortSerialzier(instance.recipe,
-                                     context=self.context).data
-
-
-class CartSerializer(serializers.ModelSerializer):
-
-    class Meta:
-        model = Cart
-        fields = ('user',
-                  'recipe')
-        validators = []
-
-    def validate(self, data):
-        return check_unique_and_exists(self.context, Cart, data)
-
-    def to_representation(self, instance):
-        return RecipeShortSerialzier(instance.recipe,
-                                     context=self.context).data
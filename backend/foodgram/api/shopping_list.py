@@ -0,0 +1,107 @@
+import csv
+import json
+from abc import ABC, abstractmethod
+
+from rest_framework.negotiation import DefaultContentNegotiation
+
+FORMATS = {}
+
+
+def register(format_class):
+    """Регистрация формата выгрузки списка покупок."""
+    FORMATS[format_class.format] = format_class()
+    return format_class
+
+
+class IgnoreFormatNegotiation(DefaultContentNegotiation):
+    """
+    Параметр format выбирает формат выгрузки, а не рендерер DRF,
+    поэтому ответы с ошибками отдаются первым рендерером.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class ShoppingListFormat(ABC):
+    """
+    Базовый формат выгрузки.
+    Строки преобразуются в текст по одной, поэтому
+    выгрузка целиком не собирается в памяти.
+    """
+    format = None
+    content_type = None
+
+    def header(self):
+        return ''
+
+    @abstractmethod
+    def row(self, item, first):
+        """Текст одной строки; first - первая ли это строка."""
+
+    def footer(self):
+        return ''
+
+    def stream(self, items):
+        """Заголовок отдается до получения списка покупок."""
+        yield self.header()
+        first = True
+        for item in items:
+            yield self.row(item, first)
+            first = False
+        yield self.footer()
+
+    def filename(self):
+        return f'shopping_list.{self.format}'
+
+
+@register
+class TextFormat(ShoppingListFormat):
+    format = 'txt'
+    content_type = 'text/plain; charset=utf-8'
+
+    def header(self):
+        return 'Список покупок:'
+
+    def row(self, item, first):
+        return (f"\n{item['name']} - "
+                f"{item['amount']} {item['measurement_unit']}")
+
+
+class Echo:
+    """Буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+@register
+class CsvFormat(ShoppingListFormat):
+    format = 'csv'
+    content_type = 'text/csv; charset=utf-8'
+    fields = ('name', 'amount', 'measurement_unit')
+
+    def __init__(self):
+        self.writer = csv.writer(Echo())
+
+    def header(self):
+        return self.writer.writerow(self.fields)
+
+    def row(self, item, first):
+        return self.writer.writerow([item[field] for field in self.fields])
+
+
+@register
+class JsonFormat(ShoppingListFormat):
+    format = 'json'
+    content_type = 'application/json'
+
+    def header(self):
+        return '['
+
+    def row(self, item, first):
+        text = json.dumps(item, ensure_ascii=False)
+        return text if first else f',{text}'
+
+    def footer(self):
+        return ']'
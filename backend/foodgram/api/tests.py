@@ -0,0 +1,100 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from foods.models import (Favorite, Ingredient, Recipe, RecipeIngredients,
+                          RecipeTags, Tag)
+from rest_framework.test import APIClient
+from users.models import Follow
+
+User = get_user_model()
+
+
+class RecipeQueryCountTest(TestCase):
+    """
+    Число запросов не зависит от размера страницы и состава рецепта.
+    Кэши включены, как в настройках по умолчанию; перед каждым
+    замером они сбрасываются, чтобы проверялся путь с промахом кэша.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author = (
+            User.objects.create_user(
+                email=f'{name}@example.com', username=name,
+                password='password', first_name=name, last_name=name
+            )
+            for name in ('user', 'author')
+        )
+        tags = Tag.objects.bulk_create(
+            Tag(name=f'Тег {number}', color='#000000', slug=f'tag{number}')
+            for number in range(3)
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(10)
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {number}', text='Текст',
+                image='recipes/images/recipe.png', cooking_time=1
+            )
+            for number in range(10)
+        ]
+        for number, recipe in enumerate(cls.recipes, start=1):
+            RecipeIngredients.objects.bulk_create(
+                RecipeIngredients(recipe_id=recipe, ingredient_id=ingredient,
+                                  amount=1)
+                for ingredient in ingredients[:number]
+            )
+            RecipeTags.objects.bulk_create(
+                RecipeTags(recipe_id=recipe, tag_id=tag) for tag in tags
+            )
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[0])
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def warm_up(self, url):
+        """
+        Первый запрос загружает справочники в память процесса.
+        Общий кэш затем сбрасывается.
+        """
+        self.get(url)
+        cache.clear()
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.get(url)
+        cache.clear()
+        return len(queries)
+
+    def test_list_does_not_depend_on_page_size(self):
+        self.warm_up('/api/recipes/?limit=10')
+        expected = self.count_queries('/api/recipes/?limit=1')
+        with self.assertNumQueries(expected):
+            response = self.get('/api/recipes/?limit=10')
+        self.assertEqual(len(response.json()['results']), 10)
+
+    def test_detail_does_not_depend_on_ingredients(self):
+        first, last = self.recipes[0], self.recipes[-1]
+        self.warm_up(f'/api/recipes/{first.pk}/')
+        expected = self.count_queries(f'/api/recipes/{first.pk}/')
+        with self.assertNumQueries(expected):
+            response = self.get(f'/api/recipes/{last.pk}/')
+        self.assertEqual(len(response.json()['ingredients']), 10)
+
+
+@override_settings(RECIPE_FRAGMENTS={'CACHE': False, 'TIMEOUT': 0},
+                   USER_STATE={'CACHE': False, 'TIMEOUT': 0})
+class UncachedRecipeQueryCountTest(RecipeQueryCountTest):
+    """То же без кэша фрагментов рецептов и состояния пользователя."""
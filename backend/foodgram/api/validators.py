@@ -1,55 +1,55 @@
-from foods.models import Favorite
+from django.db import transaction
+from foods.counters import suspend_counters
+from foods.models import Cart, Favorite
+from foods.signals import suspend_relation_signals
 from rest_framework import serializers
 from users.models import Follow
 
+from .batch import apply_changes, delete_pairs, insert_pairs
 
-def check_unique_and_exists(context, model, data):
-    request = context['request']
-    curr_user = request.user
-    method = request.method
-    if model == Follow:
-        author = data['author']
-        pair = curr_user.follower.filter(author=author)
-    else:
-        recipe = data['recipe']
-        pair = model.objects.filter(recipe=recipe, user=curr_user)
-
-    if method == 'DELETE':
-        if not pair.exists():
-            if model == Follow:
-                raise serializers.ValidationError(
-                    {'errors': 'Такой подписки не существует.'}
-                )
-            elif model == Favorite:
-                raise serializers.ValidationError(
-                    {'errors': 'Такого избранного не существует.'}
-                )
-            else:
-                raise serializers.ValidationError(
-                    {'errors': 'Такого элемента списка покупок нет.'}
-                )
-        return data
-    if pair.exists():
-        if model == Follow:
-            raise serializers.ValidationError(
-                {'errors': 'Такая подписка уже существует.'}
-            )
-        elif model == Favorite:
-            raise serializers.ValidationError(
-                {'errors': 'Такое избранное уже существует.'}
-            )
-        else:
-            raise serializers.ValidationError(
-                {'errors': 'Такой элемент списка покупок уже есть.'}
-            )
-    if model == Follow:
-        if curr_user == author:
-            raise serializers.ValidationError(
-                {'errors': 'Нельзя подписаться на самого себя.'}
-            )
-    elif model == Favorite:
-        if curr_user == recipe.author:
-            raise serializers.ValidationError(
-                {'errors': 'Нельзя добавлять свои рецепты в ищбранное.'}
-            )
-    return data
+ERRORS = {
+    Follow: {
+        'missing': 'Такой подписки не существует.',
+        'exists': 'Такая подписка уже существует.',
+        'self': 'Нельзя подписаться на самого себя.',
+    },
+    Favorite: {
+        'missing': 'Такого избранного не существует.',
+        'exists': 'Такое избранное уже существует.',
+        'self': 'Нельзя добавлять свои рецепты в ищбранное.',
+    },
+    Cart: {
+        'missing': 'Такого элемента списка покупок нет.',
+        'exists': 'Такой элемент списка покупок уже есть.',
+    },
+}
+
+
+def raise_pair_error(model, error):
+    raise serializers.ValidationError({'errors': ERRORS[model][error]})
+
+
+@transaction.atomic
+def create_unique_pair(model, user, field, pk):
+    """
+    Создание связи одним INSERT ... ON CONFLICT DO NOTHING.
+    Повтор отсекается ограничением уникальности в БД, поэтому
+    параллельные запросы не создают дубликатов.
+    """
+    with suspend_counters(), suspend_relation_signals():
+        added = insert_pairs(model, user, field, [pk])
+    if not added:
+        raise_pair_error(model, 'exists')
+    apply_changes(model, user, added, set())
+
+
+@transaction.atomic
+def delete_unique_pair(model, user, field, pk):
+    """
+    Удаление связи одним DELETE ... RETURNING;
+    возвращает False, если связи не было.
+    """
+    with suspend_counters(), suspend_relation_signals():
+        removed = delete_pairs(model, user, field, [pk])
+    apply_changes(model, user, set(), removed)
+    return bool(removed)
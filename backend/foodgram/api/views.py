@@ -1,41 +1,105 @@
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters import rest_framework
-from foods.models import (Cart, Favorite, Ingredient, Recipe,
-                          RecipeIngredients, Tag)
+from foods.cache import get_shopping_list, iter_shopping_list
+from foods.catalogue import ingredient_catalogue, tag_catalogue
+from foods.ingredient_index import ingredient_index
+from foods.models import Cart, Favorite, Ingredient, Recipe, Tag
+from foods.signals import delete_recipes
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from .batch import BatchSerializer, apply_batch
+from .conditional import conditional_catalogue, conditional_recipe
 from .filters import CustomSearchFilter, RecipeFilter
 from .paginator import CustomPaginator
+from .parsers import RecipeJSONParser
 from .permissions import AnonReadOnlyOrOwnerOrAdmin
-from .serializers import (CartSerializer, FavoriteSerializer,
-                          IngredientSerializer, RecipeGetSerializer,
-                          RecipeWriteSerializer, TagSerializer)
+from .serializers import (IngredientSerializer, RecipeGetSerializer,
+                          RecipeShortSerialzier, RecipeWriteSerializer,
+                          TagSerializer)
+from .shopping_list import FORMATS, IgnoreFormatNegotiation
+from .validators import (create_unique_pair, delete_unique_pair,
+                         raise_pair_error)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class CatalogueViewSetMixin:
+    """Объекты справочника берутся из памяти процесса, а не из БД."""
+    catalogue = None
+
+    def get_object(self):
+        try:
+            pk = int(self.kwargs[self.lookup_field])
+        except ValueError:
+            raise Http404
+        record = self.catalogue.get(pk, self.request)
+        if record is None:
+            raise Http404
+        self.check_object_permissions(self.request, record)
+        return record
+
+
+class IngredientViewSet(CatalogueViewSetMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для модели Ingredient."""
+    replica_reads = True
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    catalogue = ingredient_catalogue
     pagination_class = None
     filter_backends = [CustomSearchFilter]
     search_fields = ['^name']
     permission_classes = (AnonReadOnlyOrOwnerOrAdmin,)
 
+    @conditional_catalogue(Ingredient)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @conditional_catalogue(Ingredient)
+    def list(self, request, *args, **kwargs):
+        """
+        Поиск по названию через индекс в памяти процесса.
+        Если индекс отключен, поиск выполняется в БД.
+        """
+        config = settings.INGREDIENT_INDEX
+        if not config['ENABLED']:
+            return super().list(request, *args, **kwargs)
+        name = request.query_params.get(CustomSearchFilter.search_param)
+        ingredients = ingredient_index.search(
+            name, limit=config['LIMIT'] if name else None, request=request
+        )
+        serializer = self.get_serializer(ingredients, many=True)
+        return Response(serializer.data)
+
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CatalogueViewSetMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для модели Tag."""
+    replica_reads = True
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    catalogue = tag_catalogue
     pagination_class = None
     permission_classes = (AnonReadOnlyOrOwnerOrAdmin,)
 
+    @conditional_catalogue(Tag)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @conditional_catalogue(Tag)
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer(tag_catalogue.all(request),
+                                         many=True)
+        return Response(serializer.data)
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """Вьюсет для модеи Recipe."""
+    replica_reads = True
     queryset = Recipe.objects.all()
+    parser_classes = (RecipeJSONParser, MultiPartParser, FormParser)
     filter_backends = [rest_framework.DjangoFilterBackend]
     filterset_class = RecipeFilter
     pagination_class = CustomPaginator
@@ -46,40 +110,73 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeGetSerializer
         return RecipeWriteSerializer
 
+    def get_queryset(self):
+        """
+        С кэшем фрагментов связи загружаются сериализатором
+        только для рецептов, которых нет в кэше.
+        """
+        queryset = super().get_queryset()
+        if self.action not in ['list', 'retrieve']:
+            return queryset
+        # Поисковый вектор нужен только в условиях запроса.
+        queryset = queryset.defer('search_vector')
+        if not settings.RECIPE_FRAGMENTS['CACHE']:
+            return queryset.with_relations()
+        return queryset
+
+    @conditional_recipe
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
     def perform_update(self, serializer):
         serializer.save(author=self.request.user)
 
+    def perform_destroy(self, instance):
+        delete_recipes(Recipe.objects.filter(pk=instance.pk))
+
     def post_or_delete(self, request, pk, model):
         """
         Вспомогательный метод для создания либо
         удаления избранного/элементов списка покупок.
+        Наличие связи определяется результатом INSERT или DELETE,
+        без предварительной проверки.
         """
         user = request.user
+        if request.method == 'DELETE':
+            if not delete_unique_pair(model, user, 'recipe', pk):
+                get_object_or_404(Recipe, pk=pk)
+                raise_pair_error(model, 'missing')
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
         recipe = get_object_or_404(Recipe, pk=pk)
-        data = {'user': user.pk,
-                'recipe': recipe.pk}
-        context = {'request': request}
-        if model == Favorite:
-            serializer = FavoriteSerializer(
-                data=data,
-                context=context
-            )
-        else:
-            serializer = CartSerializer(
-                data=data,
-                context=context
-            )
-        if serializer.is_valid(raise_exception=True):
-            if request.method == 'DELETE':
-                model.objects.filter(recipe=recipe, user=user).delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
+        if model == Favorite and recipe.author_id == user.pk:
+            raise_pair_error(model, 'self')
+        create_unique_pair(model, user, 'recipe', recipe.pk)
+        serializer = RecipeShortSerialzier(recipe,
+                                           context={'request': request})
+        return Response(serializer.data)
 
-            serializer.save()
-            return Response(serializer.data)
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+    def post_or_delete_batch(self, request, model):
+        """
+        Массовое добавление и удаление избранного/элементов списка
+        покупок. Все id проверяются одним запросом.
+        """
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        recipes = dict(Recipe.objects.filter(
+            pk__in=data['add'] + data['remove']
+        ).values_list('pk', 'author_id'))
+        forbidden = set()
+        if model == Favorite:
+            forbidden = {pk for pk, author_id in recipes.items()
+                         if author_id == request.user.pk}
+        results = apply_batch(model, request.user, 'recipe', data,
+                              set(recipes), forbidden)
+        return Response({'results': results})
 
     @action(detail=True, methods=['post', 'delete'])
     def favorite(self, request, pk):
@@ -89,13 +186,40 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def shopping_cart(self, request, pk):
         return self.post_or_delete(request, pk, Cart)
 
-    @action(detail=False)
+    @action(detail=False, methods=['post'],
+            permission_classes=(IsAuthenticated,))
+    def favorite_batch(self, request):
+        return self.post_or_delete_batch(request, Favorite)
+
+    @action(detail=False, methods=['post'],
+            permission_classes=(IsAuthenticated,))
+    def shopping_cart_batch(self, request):
+        return self.post_or_delete_batch(request, Cart)
+
+    @action(detail=False,
+            permission_classes=(IsAuthenticated,),
+            content_negotiation_class=IgnoreFormatNegotiation)
     def download_shopping_cart(self, request):
-        """Скачивание списка покупок."""
-        current_user = request.user
-        text = RecipeIngredients.form_shopping_list(user=current_user)
-        file_name = 'shopping_list.txt'
-        response = HttpResponse(content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename="{file_name}"'
-        response.writelines(text)
+        """
+        Скачивание списка покупок.
+        Формат выбирается параметром format: txt, csv или json.
+        """
+        export = FORMATS.get(request.query_params.get('format', 'txt'))
+        if export is None:
+            return Response(
+                {'errors': f'Доступные форматы: {", ".join(FORMATS)}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        items = iter_shopping_list(request.user)
+        response = StreamingHttpResponse(export.stream(items),
+                                         content_type=export.content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="{export.filename()}"'
+        )
+        response['X-Accel-Buffering'] = 'no'
         return response
+
+    @action(detail=False, permission_classes=(IsAuthenticated,))
+    def shopping_list(self, request):
+        """Просмотр списка покупок в формате JSON."""
+        return Response(get_shopping_list(request.user))
@@ -32,6 +32,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.profiling.ProfilingMiddleware',
+    'api.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -81,6 +83,80 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения: DB_REPLICA_HOSTS=host1[:port],host2[:port]
+REPLICAS = {
+    'ALIASES': [],
+    'PIN_COOKIE': 'db_primary',
+    'PIN_SECONDS': 5,
+}
+
+for number, address in enumerate(
+    filter(None, os.getenv('DB_REPLICA_HOSTS', default='').split(',')),
+    start=1
+):
+    host, _, port = address.strip().partition(':')
+    alias = f'replica_{number}'
+    DATABASES[alias] = dict(DATABASES['default'],
+                            HOST=host,
+                            PORT=port or DATABASES['default']['PORT'],
+                            TEST={'MIRROR': 'default'})
+    REPLICAS['ALIASES'].append(alias)
+
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60 * 24
+
+CATALOGUE_CACHE_MAX_AGE = 60
+
+BATCH_MAX_ITEMS = 100
+
+RECIPE_IMAGES = {
+    'ASYNC': os.getenv('RECIPE_IMAGES_ASYNC', default='True') == 'True',
+    'WORKERS': 2,
+    'FORMAT': 'WEBP',
+    'QUALITY': 80,
+    'MAX_BYTES': 10 * 1024 * 1024,
+    'MAX_DIMENSIONS': (4096, 4096),
+    'RENDITIONS': {
+        'short': (160, 160),
+        'card': (480, 480),
+        'detail': (1200, 1200),
+    },
+}
+
+USER_STATE = {
+    'CACHE': os.getenv('USER_STATE_CACHE', default='True') == 'True',
+    'TIMEOUT': 300,
+}
+
+RECIPE_FRAGMENTS = {
+    'CACHE': os.getenv('RECIPE_FRAGMENT_CACHE', default='True') == 'True',
+    'TIMEOUT': 60 * 60,
+}
+
+PAGINATION = {
+    'COUNT': os.getenv('PAGINATION_COUNT', default='exact'),
+    'ESTIMATE_THRESHOLD': 10000,
+    'COUNT_CACHE_TIMEOUT': 60,
+}
+
+SEARCH_CONFIG = 'russian'
+
+INGREDIENT_INDEX = {
+    'ENABLED': os.getenv('INGREDIENT_INDEX_ENABLED', default='True') == 'True',
+    'LIMIT': 50,
+}
+
 
 # Password validation
 
@@ -132,7 +208,16 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10,
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
-    ]
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 DJOSER = {
@@ -143,3 +228,27 @@ DJOSER = {
     'SERIALIZERS': {'user': 'users.serializers.CustomUserSerializer', },
     'HIDE_USERS': False
 }
+
+PROFILING = {
+    'ENABLED': os.getenv('PROFILING_ENABLED', default='False') == 'True',
+    'LOG': os.getenv('PROFILING_LOG', default='False') == 'True',
+    'HEADER': 'HTTP_X_PROFILING_TOKEN',
+    'TOKEN_MAX_AGE': 60 * 60,
+    'DUPLICATES': 5,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from . import models
+from .signals import delete_recipes
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -19,19 +20,25 @@ class TagAdmin(admin.ModelAdmin):
 
 
 class RecipeAdmin(admin.ModelAdmin):
-    def favorite_count(self, obj):
-        return models.Favorite.objects.filter(recipe=obj).count()
-
-    favorite_count.short_description = 'Добавлено в избранное'
     list_display = ('name',
                     'author',
                     'pub_date',
-                    'favorite_count')
+                    'favorites_count',
+                    'carts_count')
+    list_select_related = ('author',)
+    readonly_fields = ('favorites_count',
+                       'carts_count')
     list_filter = ('name',
                    'author',
                    'tags')
     empty_value_display = '-пусто-'
 
+    def delete_model(self, request, obj):
+        delete_recipes(models.Recipe.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        delete_recipes(queryset)
+
 
 class RecipeIngredientsAdmin(admin.ModelAdmin):
     list_display = ('ingredient_id',
@@ -0,0 +1,189 @@
+from collections import namedtuple
+from hashlib import md5
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+from users.models import Follow
+
+from .models import Cart, Favorite, Ingredient, RecipeIngredients, Tag
+
+CATALOGUE_VERSION = 'catalogue_version:{}'
+SHOPPING_LIST_VERSION = 'shopping_list_version'
+USER_SHOPPING_LIST_VERSION = 'shopping_list_version:{}'
+SHOPPING_LIST = 'shopping_list:{}:{}:{}'
+USER_STATE_VERSION = 'user_state_version:{}'
+USER_STATE = 'user_state:{}:{}'
+RECIPE_FRAGMENT = 'recipe_fragment:{}:{}:{}'
+
+UserState = namedtuple('UserState', ('favorites', 'cart', 'following'))
+EMPTY_USER_STATE = UserState(frozenset(), frozenset(), frozenset())
+
+
+def primary(queryset):
+    """
+    Данные для кэша читаются с основной БД, чтобы под новой версией
+    не сохранилась отстающая копия с реплики.
+    """
+    return queryset.using(router.db_for_write(queryset.model))
+
+
+def get_version(key):
+    """
+    Текущая версия данных по ключу.
+    Если версии в кэше нет, создается новая, не совпадающая с прежними.
+    """
+    version = cache.get(key)
+    if version is not None:
+        return version
+    version = uuid4().hex
+    if cache.add(key, version, timeout=None):
+        return version
+    return cache.get(key, version)
+
+
+def bump_versions(keys):
+    """
+    Сброс версий после фиксации транзакции, чтобы параллельный запрос
+    не сохранил в кэш данные, прочитанные до изменения.
+    """
+    keys = list(keys)
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_catalogue_version(model):
+    """Версия справочника: тегов или ингредиентов."""
+    return get_version(CATALOGUE_VERSION.format(model._meta.label_lower))
+
+
+def invalidate_catalogue(model):
+    bump_versions([CATALOGUE_VERSION.format(model._meta.label_lower)])
+
+
+def shopping_list_key(user):
+    return SHOPPING_LIST.format(
+        user.pk,
+        get_version(SHOPPING_LIST_VERSION),
+        get_version(USER_SHOPPING_LIST_VERSION.format(user.pk))
+    )
+
+
+def iter_shopping_list(user):
+    """
+    Список покупок пользователя из кэша либо из БД.
+    При промахе строки читаются через iterator() (серверный курсор
+    в PostgreSQL) и отдаются сразу; в кэш список сохраняется
+    после последней строки.
+    """
+    key = shopping_list_key(user)
+    items = cache.get(key)
+    if items is not None:
+        yield from items
+        return
+    items = []
+    for item in primary(RecipeIngredients.shopping_list(user=user)).iterator():
+        items.append(item)
+        yield item
+    cache.set(key, items, timeout=settings.SHOPPING_LIST_CACHE_TIMEOUT)
+
+
+def get_shopping_list(user):
+    return list(iter_shopping_list(user))
+
+
+def invalidate_shopping_lists(user_ids):
+    bump_versions(USER_SHOPPING_LIST_VERSION.format(user_id)
+                  for user_id in user_ids)
+
+
+def invalidate_recipe_shopping_lists(recipe_id):
+    """Сброс списков покупок всех, у кого рецепт в списке покупок."""
+    invalidate_shopping_lists(
+        Cart.objects.filter(recipe_id=recipe_id).values_list('user_id',
+                                                             flat=True)
+    )
+
+
+def invalidate_all_shopping_lists():
+    bump_versions([SHOPPING_LIST_VERSION])
+
+
+def load_user_state(user):
+    return UserState(
+        frozenset(primary(Favorite.objects.filter(user=user).values_list(
+            'recipe_id', flat=True))),
+        frozenset(primary(Cart.objects.filter(user=user).values_list(
+            'recipe_id', flat=True))),
+        frozenset(primary(Follow.objects.filter(user=user).values_list(
+            'author_id', flat=True))),
+    )
+
+
+def get_user_state(request):
+    """
+    id рецептов в избранном и в списке покупок и id авторов,
+    на которых подписан текущий пользователь.
+    Загружаются один раз за запрос, между запросами хранятся в кэше.
+    """
+    if request is None or not request.user.is_authenticated:
+        return EMPTY_USER_STATE
+    state = getattr(request, '_user_state', None)
+    if state is not None:
+        return state
+    user = request.user
+    config = settings.USER_STATE
+    if config['CACHE']:
+        key = USER_STATE.format(
+            user.pk, get_version(USER_STATE_VERSION.format(user.pk))
+        )
+        state = cache.get(key)
+        if state is None:
+            state = load_user_state(user)
+            cache.set(key, state, timeout=config['TIMEOUT'])
+    else:
+        state = load_user_state(user)
+    request._user_state = state
+    return state
+
+
+def invalidate_user_states(user_ids):
+    bump_versions(USER_STATE_VERSION.format(user_id) for user_id in user_ids)
+
+
+def get_fragment_namespace(base_url):
+    """
+    Общая часть ключей фрагментов рецептов: адрес сайта для ссылок
+    на изображения и версии справочников тегов и ингредиентов.
+    """
+    return md5(repr((base_url,
+                     get_catalogue_version(Tag),
+                     get_catalogue_version(Ingredient))).encode()).hexdigest()
+
+
+def recipe_fragment_key(recipe, namespace):
+    """
+    Версия рецепта - время изменения и готовность копий изображения.
+    Время обновляется при изменении рецепта, его тегов, ингредиентов
+    и данных автора.
+    """
+    version = (f'{recipe.updated_at.timestamp()}'
+               f'-{int(recipe.image_renditions_ready)}')
+    return RECIPE_FRAGMENT.format(recipe.pk, version, namespace)
+
+
+def get_recipe_fragments(recipes, namespace):
+    """Сохраненные фрагменты рецептов одним обращением к кэшу."""
+    keys = {recipe_fragment_key(recipe, namespace): recipe.pk
+            for recipe in recipes}
+    return {keys[key]: fragment
+            for key, fragment in cache.get_many(list(keys)).items()}
+
+
+def set_recipe_fragments(recipes, fragments, namespace):
+    cache.set_many(
+        {recipe_fragment_key(recipe, namespace): fragments[recipe.pk]
+         for recipe in recipes},
+        timeout=settings.RECIPE_FRAGMENTS['TIMEOUT']
+    )
@@ -0,0 +1,128 @@
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+from django.db import router
+
+from .cache import get_catalogue_version, primary
+from .models import Ingredient, Tag
+
+Snapshot = namedtuple('Snapshot', ('records', 'by_id', 'by_key'))
+
+
+class Record:
+    """
+    Неизменяемая запись справочника.
+    Поля хранятся в __slots__, без словаря атрибутов у каждой записи.
+    """
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} нельзя изменить')
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.values() == other.values()
+
+    def __hash__(self):
+        return hash(self.values())
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}'
+                           for name in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+    @property
+    def pk(self):
+        return self.id
+
+    def values(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+
+class TagRecord(Record):
+    __slots__ = ('id', 'name', 'color', 'slug')
+
+
+class IngredientRecord(Record):
+    __slots__ = ('id', 'name', 'measurement_unit')
+
+
+class Catalogue:
+    """
+    Справочник в памяти процесса: записи по id и по уникальным полям.
+    Загружается при первом обращении и перечитывается,
+    когда меняется версия справочника в общем кэше.
+    Версия проверяется один раз за запрос.
+    """
+
+    def __init__(self, model, record, keys=()):
+        self.model = model
+        self.record = record
+        self.keys = keys
+        self.lock = threading.Lock()
+        self.version = None
+        self.snapshot = None
+
+    def load(self):
+        records = tuple(
+            self.record(*row) for row in
+            primary(self.model.objects.order_by('pk').values_list(
+                *self.record.__slots__))
+        )
+        by_id = MappingProxyType({record.id: record for record in records})
+        by_key = {
+            key: MappingProxyType({getattr(record, key): record
+                                   for record in records})
+            for key in self.keys
+        }
+        return Snapshot(records, by_id, by_key)
+
+    def get_snapshot(self, request=None):
+        snapshots = getattr(request, '_catalogues', None)
+        if snapshots is not None and self.model in snapshots:
+            return snapshots[self.model]
+        version = get_catalogue_version(self.model)
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.snapshot = self.load()
+                    self.version = version
+        snapshot = self.snapshot
+        if request is not None:
+            if snapshots is None:
+                snapshots = request._catalogues = {}
+            snapshots[self.model] = snapshot
+        return snapshot
+
+    def all(self, request=None):
+        return self.get_snapshot(request).records
+
+    def get(self, pk, request=None):
+        return self.get_snapshot(request).by_id.get(pk)
+
+    def get_many(self, ids, request=None):
+        """Записи по id; отсутствующие id пропускаются."""
+        by_id = self.get_snapshot(request).by_id
+        return {pk: by_id[pk] for pk in ids if pk in by_id}
+
+    def lookup(self, key, request=None):
+        """Записи по уникальному полю, например тег по slug."""
+        return self.get_snapshot(request).by_key[key]
+
+    def instances(self, ids, request=None):
+        """
+        Объекты модели по id без запроса к БД,
+        для присвоения внешним ключам при записи.
+        """
+        db = router.db_for_read(self.model)
+        fields = self.record.__slots__
+        return {pk: self.model.from_db(db, fields, record.values())
+                for pk, record in self.get_many(ids, request).items()}
+
+
+tag_catalogue = Catalogue(Tag, TagRecord, keys=('slug',))
+ingredient_catalogue = Catalogue(Ingredient, IngredientRecord)
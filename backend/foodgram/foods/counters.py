@@ -0,0 +1,66 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Cart, Favorite, Recipe
+
+User = get_user_model()
+
+RECIPE_COUNTERS = {Favorite: 'favorites_count',
+                   Cart: 'carts_count'}
+
+counters_suspended = ContextVar('counters_suspended', default=False)
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарное изменение счетчика одним UPDATE."""
+    if counters_suspended.get():
+        return
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+@contextmanager
+def suspend_counters():
+    """
+    Отключение обновления счетчиков в сигналах на время
+    массовых операций, которые обновляют счетчики сами.
+    """
+    token = counters_suspended.set(True)
+    try:
+        yield
+    finally:
+        counters_suspended.reset(token)
+
+
+def change_counters(model, pks, field, delta):
+    """Изменение счетчика у набора объектов одним UPDATE."""
+    if pks:
+        model.objects.filter(pk__in=pks).update(**{field: F(field) + delta})
+
+
+def count_subquery(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            total=Count('pk')
+        ).values('total'),
+        output_field=IntegerField()
+    ), 0)
+
+
+@transaction.atomic
+def recount():
+    """Пересчет всех счетчиков по фактическим данным."""
+    recipes = Recipe.objects.update(
+        favorites_count=count_subquery(Favorite, 'recipe'),
+        carts_count=count_subquery(Cart, 'recipe')
+    )
+    users = User.objects.update(
+        recipes_count=count_subquery(Recipe, 'author')
+    )
+    return recipes, users
@@ -0,0 +1,98 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = 'recipes/renditions'
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    """Пул потоков создается при первой задаче и живет до конца процесса."""
+    return ThreadPoolExecutor(
+        max_workers=settings.RECIPE_IMAGES['WORKERS'],
+        thread_name_prefix='renditions'
+    )
+
+
+def rendition_path(image_name, rendition):
+    """Путь уменьшенной копии строится из имени исходного файла."""
+    stem = PurePosixPath(image_name).stem
+    extension = settings.RECIPE_IMAGES['FORMAT'].lower()
+    return f'{RENDITIONS_DIR}/{stem}_{rendition}.{extension}'
+
+
+def rendition_urls(recipe):
+    """
+    Адреса уменьшенных копий изображения рецепта.
+    Пока копии не готовы, отдается адрес исходного файла.
+    """
+    renditions = settings.RECIPE_IMAGES['RENDITIONS']
+    if not recipe.image:
+        return {rendition: None for rendition in renditions}
+    if not recipe.image_renditions_ready:
+        return {rendition: recipe.image.url for rendition in renditions}
+    return {
+        rendition: default_storage.url(rendition_path(recipe.image.name,
+                                                      rendition))
+        for rendition in renditions
+    }
+
+
+def build_renditions(recipe_id, image_name):
+    """Создание уменьшенных копий и отметка о готовности в рецепте."""
+    config = settings.RECIPE_IMAGES
+    with default_storage.open(image_name) as file:
+        original = Image.open(file)
+        original.load()
+    if config['FORMAT'] == 'JPEG' and original.mode != 'RGB':
+        original = original.convert('RGB')
+    for rendition, size in config['RENDITIONS'].items():
+        image = original.copy()
+        image.thumbnail(size)
+        buffer = BytesIO()
+        image.save(buffer, config['FORMAT'], quality=config['QUALITY'])
+        path = rendition_path(image_name, rendition)
+        if default_storage.exists(path):
+            default_storage.delete(path)
+        default_storage.save(path, ContentFile(buffer.getvalue()))
+    Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+        image_renditions_ready=True
+    )
+
+
+def run_in_background(recipe_id, image_name):
+    try:
+        build_renditions(recipe_id, image_name)
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', image_name)
+    finally:
+        connections.close_all()
+
+
+def schedule_renditions(recipe):
+    """
+    Обработка изображения после фиксации транзакции.
+    По умолчанию выполняется в фоновом пуле потоков,
+    чтобы не увеличивать время ответа.
+    """
+    recipe_id, image_name = recipe.pk, recipe.image.name
+    if settings.RECIPE_IMAGES['ASYNC']:
+        transaction.on_commit(lambda: get_executor().submit(
+            run_in_background, recipe_id, image_name
+        ))
+    else:
+        transaction.on_commit(
+            lambda: build_renditions(recipe_id, image_name)
+        )
@@ -0,0 +1,192 @@
+import csv
+import io
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connections, router, transaction
+
+from .cache import invalidate_all_shopping_lists, invalidate_catalogue
+from .models import Ingredient
+
+DATA_DIR = Path(settings.BASE_DIR).resolve().joinpath('data')
+
+
+def chunks(iterable, size):
+    """Разбиение генератора на списки фиксированного размера."""
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+class CatalogueImporter:
+    """
+    Добавление записей справочника пачками.
+    Существующие ключи загружаются одним запросом,
+    в базу отправляются только новые и измененные строки.
+    """
+
+    def __init__(self, model, fields, key):
+        self.model = model
+        self.fields = fields
+        self.key = key
+        self.update_fields = [field for field in fields if field not in key]
+        self.db = router.db_for_write(model)
+        self.stats = dict.fromkeys(
+            ('read', 'created', 'updated', 'skipped'), 0
+        )
+
+    def read_csv(self, path):
+        with open(path, encoding='UTF-8', newline='') as file:
+            for line, row in enumerate(csv.reader(file), start=1):
+                if not row:
+                    continue
+                if len(row) != len(self.fields):
+                    raise CommandError(
+                        f'{path}:{line}: ожидается столбцов: '
+                        f'{len(self.fields)} ({", ".join(self.fields)})'
+                    )
+                yield dict(zip(self.fields, row))
+
+    def read_json(self, path):
+        with open(path, encoding='UTF-8') as file:
+            rows = json.load(file)
+        for number, row in enumerate(rows, start=1):
+            try:
+                yield {field: row[field] for field in self.fields}
+            except (KeyError, TypeError):
+                raise CommandError(
+                    f'{path}: запись {number}: ожидаются поля '
+                    f'{", ".join(self.fields)}'
+                )
+
+    def read(self, path):
+        readers = {'.csv': self.read_csv, '.json': self.read_json}
+        reader = readers.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError('Поддерживаются файлы .csv и .json')
+        for row in reader(path):
+            yield {field: str(value).strip() for field, value in row.items()}
+
+    def load_existing(self):
+        return {
+            row[:len(self.key)]: row
+            for row in self.model.objects.using(self.db).values_list(
+                *self.key, *self.update_fields, 'pk'
+            ).iterator()
+        }
+
+    def copy(self, objects):
+        """Вставка через COPY, без разбора отдельных INSERT."""
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+        for obj in objects:
+            writer.writerow([getattr(obj, field) for field in self.fields])
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {quote(self.model._meta.db_table)} '
+                f'({", ".join(quote(field) for field in self.fields)}) '
+                f'FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+
+    def insert(self, objects):
+        if connections[self.db].vendor == 'postgresql':
+            self.copy(objects)
+        else:
+            self.model.objects.using(self.db).bulk_create(objects)
+
+    def process(self, rows, existing, update, dry_run):
+        new, changed = [], []
+        for row in rows:
+            self.stats['read'] += 1
+            key = tuple(row[field] for field in self.key)
+            values = tuple(row[field] for field in self.update_fields)
+            current = existing.get(key)
+            if current is None:
+                new.append(self.model(**row))
+                existing[key] = key + values + (None,)
+            elif (update and current[-1] is not None
+                  and current[len(self.key):-1] != values):
+                changed.append(self.model(pk=current[-1], **row))
+                existing[key] = key + values + current[-1:]
+            else:
+                self.stats['skipped'] += 1
+        if not dry_run:
+            if new:
+                self.insert(new)
+            if changed:
+                self.model.objects.using(self.db).bulk_update(
+                    changed, self.update_fields
+                )
+        self.stats['created'] += len(new)
+        self.stats['updated'] += len(changed)
+
+    def run(self, path, batch_size, update=False, dry_run=False,
+            progress=None):
+        with transaction.atomic(using=self.db):
+            existing = self.load_existing()
+            for rows in chunks(self.read(path), batch_size):
+                self.process(rows, existing, update, dry_run)
+                if progress is not None:
+                    progress(self.stats)
+            if not dry_run and (self.stats['created']
+                                or self.stats['updated']):
+                # bulk_create и bulk_update не отправляют сигналы.
+                invalidate_catalogue(self.model)
+                if self.model is Ingredient:
+                    invalidate_all_shopping_lists()
+        return self.stats
+
+
+class ImportCommand(BaseCommand):
+    """Базовая команда импорта справочника из CSV или JSON."""
+    model = None
+    fields = None
+    key = None
+    default_file = None
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', type=Path,
+                            default=DATA_DIR / self.default_file,
+                            help='Файл .csv без заголовка или .json.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--update', action='store_true',
+                            help='Обновить измененные записи.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только подсчитать изменения.')
+
+    def progress(self, stats):
+        self.stdout.write(f'Обработано строк: {stats["read"]}')
+
+    def handle(self, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        if not options['file'].is_file():
+            raise CommandError(f'Файл {options["file"]} не найден')
+        importer = CatalogueImporter(self.model, self.fields, self.key)
+        started = time.perf_counter()
+        try:
+            stats = importer.run(
+                options['file'], options['batch_size'],
+                update=options['update'], dry_run=options['dry_run'],
+                progress=self.progress if options['verbosity'] > 1 else None
+            )
+        except IntegrityError as error:
+            raise CommandError(f'Импорт отменен: {error}')
+        self.stdout.write(
+            f'{self.model._meta.verbose_name_plural}: '
+            f'прочитано {stats["read"]}, добавлено {stats["created"]}, '
+            f'обновлено {stats["updated"]}, '
+            f'без изменений {stats["skipped"]} '
+            f'за {time.perf_counter() - started:.2f} с'
+            + (' (без записи в базу)' if options['dry_run'] else '')
+        )
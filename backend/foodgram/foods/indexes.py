@@ -0,0 +1,15 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.db.models import Index
+
+
+class SearchGinIndex(GinIndex):
+    """
+    GIN индекс для поиска по tsvector в PostgreSQL.
+    На других СУБД создается обычный индекс,
+    чтобы схема создавалась, например, в SQLite.
+    """
+
+    def create_sql(self, model, schema_editor, using=''):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().create_sql(model, schema_editor, using)
+        return Index.create_sql(self, model, schema_editor, using)
@@ -0,0 +1,58 @@
+import threading
+from bisect import bisect_left, bisect_right
+
+from .catalogue import ingredient_catalogue
+
+
+def fold(text):
+    """Приведение названия к виду для поиска без учета регистра и ё."""
+    return text.casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """
+    Отсортированный индекс названий ингредиентов в памяти процесса.
+    Перестраивается, когда перечитывается справочник ингредиентов.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.source = None
+        self.snapshot = None
+
+    def load(self, source):
+        by_name = sorted(source.records, key=lambda record: (
+            fold(record.name), record.id
+        ))
+        keys = [fold(record.name) for record in by_name]
+        return keys, by_name, source.records
+
+    def get_snapshot(self, request=None):
+        source = ingredient_catalogue.get_snapshot(request)
+        if source is not self.source:
+            with self.lock:
+                if source is not self.source:
+                    self.snapshot = self.load(source)
+                    self.source = source
+        return self.snapshot
+
+    def search(self, query, limit=None, request=None):
+        """
+        Поиск по названию: сначала совпадения по началу строки,
+        затем по подстроке, внутри групп по алфавиту.
+        """
+        keys, by_name, records = self.get_snapshot(request)
+        if not query:
+            return records
+        query = fold(query)
+        start = bisect_left(keys, query)
+        end = bisect_right(keys, query + chr(0x10FFFF), lo=start)
+        result = by_name[start:end]
+        if limit is not None and len(result) >= limit:
+            return result[:limit]
+        result += [record for key, record in zip(keys, by_name)
+                   if query in key and not key.startswith(query)]
+        return result if limit is None else result[:limit]
+
+
+ingredient_index = IngredientIndex()
@@ -1,25 +1,10 @@
-import csv
-from pathlib import Path
-
-from django.conf import settings
-from django.core.management.base import BaseCommand
-
+from ...importer import ImportCommand
 from ...models import Ingredient
 
-PROJECT_DIR = Path(settings.BASE_DIR).resolve().joinpath('data')
-FILE_TO_OPEN = PROJECT_DIR / 'ingredients.csv'
 
-
-class Command(BaseCommand):
+class Command(ImportCommand):
     help = 'Импорт ингредиентов'
-
-    def handle(self, **kwargs):
-        with open(
-            FILE_TO_OPEN, 'r', encoding='UTF-8'
-        ) as file:
-            reader = csv.reader(file, delimiter=',')
-            for row in reader:
-                Ingredient.objects.get_or_create(
-                    name=row[0],
-                    measurement_unit=row[1]
-                )
+    model = Ingredient
+    fields = ('name', 'measurement_unit')
+    key = ('name', 'measurement_unit')
+    default_file = 'ingredients.csv'
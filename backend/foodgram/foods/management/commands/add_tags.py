@@ -1,26 +1,10 @@
-import csv
-from pathlib import Path
-
-from django.conf import settings
-from django.core.management.base import BaseCommand
-
+from ...importer import ImportCommand
 from ...models import Tag
 
-PROJECT_DIR = Path(settings.BASE_DIR).resolve().joinpath('data')
-FILE_TO_OPEN = PROJECT_DIR / 'tags.csv'
 
-
-class Command(BaseCommand):
+class Command(ImportCommand):
     help = 'Импорт тегов'
-
-    def handle(self, **kwargs):
-        with open(
-            FILE_TO_OPEN, 'r', encoding='UTF-8'
-        ) as file:
-            reader = csv.reader(file, delimiter=',')
-            for row in reader:
-                Tag.objects.get_or_create(
-                    name=row[0],
-                    color=row[1],
-                    slug=row[2]
-                )
+    model = Tag
+    fields = ('name', 'color', 'slug')
+    key = ('slug',)
+    default_file = 'tags.csv'
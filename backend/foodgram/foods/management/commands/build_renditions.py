@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from ...images import build_renditions
+from ...models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создание уменьшенных копий изображений рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Пересоздать копии для всех рецептов.')
+
+    def handle(self, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_renditions_ready=False)
+        processed = 0
+        for pk, image in recipes.values_list('pk', 'image').iterator():
+            try:
+                build_renditions(pk, image)
+            except (OSError, ValueError) as error:
+                self.stderr.write(f'{image}: {error}')
+                continue
+            processed += 1
+        self.stdout.write(f'Обработано изображений: {processed}')
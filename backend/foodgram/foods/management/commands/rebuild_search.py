@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ...models import Recipe
+from ...search import is_supported, update_search_vectors
+
+
+class Command(BaseCommand):
+    help = 'Пересчет поисковых векторов рецептов'
+
+    def handle(self, **kwargs):
+        recipes = Recipe.objects.all()
+        if not is_supported(recipes.db):
+            raise CommandError('Полнотекстовый поиск требует PostgreSQL')
+        updated = update_search_vectors(recipes)
+        self.stdout.write(f'Обновлено рецептов: {updated}')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from ...counters import recount
+
+
+class Command(BaseCommand):
+    help = 'Пересчет счетчиков избранного, списков покупок и рецептов'
+
+    def handle(self, **kwargs):
+        recipes, users = recount()
+        self.stdout.write(
+            f'Обновлено рецептов: {recipes}, пользователей: {users}'
+        )
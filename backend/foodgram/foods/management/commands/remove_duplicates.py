@@ -0,0 +1,123 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Min
+from users.models import Follow
+
+from ...models import (Cart, Favorite, Ingredient, Recipe, RecipeIngredients,
+                       RecipeTags)
+
+PAIRS = (
+    (RecipeIngredients, ('recipe_id', 'ingredient_id')),
+    (RecipeTags, ('recipe_id', 'tag_id')),
+    (Favorite, ('user', 'recipe')),
+    (Cart, ('user', 'recipe')),
+    (Follow, ('user', 'author')),
+)
+
+
+def table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def column(model, field):
+    return connection.ops.quote_name(model._meta.get_field(field).column)
+
+
+def duplicate_ids(model, fields):
+    """
+    SQL выборки id повторяющихся строк: в каждой группе
+    остается строка с минимальным id.
+    """
+    pk = column(model, model._meta.pk.name)
+    group_by = ', '.join(column(model, field) for field in fields)
+    return (f'SELECT {pk} FROM {table(model)} WHERE {pk} NOT IN '
+            f'(SELECT MIN({pk}) FROM {table(model)} GROUP BY {group_by})')
+
+
+class Command(BaseCommand):
+    """
+    Команда запускается до migrate, поэтому работает со старой схемой:
+    читает только существующие столбцы и пишет сырыми DELETE/UPDATE,
+    без сохранения моделей и без сигналов. Счетчики пересчитываются
+    после migrate командой recount_counters.
+    """
+    help = ('Удаление повторяющихся строк перед добавлением '
+            'ограничений уникальности')
+
+    @transaction.atomic
+    def handle(self, **kwargs):
+        with connection.cursor() as cursor:
+            self.merge_ingredients(cursor)
+            self.rename_recipes()
+            for model, fields in PAIRS:
+                pk = column(model, model._meta.pk.name)
+                cursor.execute(
+                    f'DELETE FROM {table(model)} WHERE {pk} IN '
+                    f'(SELECT {pk} FROM ({duplicate_ids(model, fields)}) '
+                    f'duplicates)'
+                )
+                self.stdout.write(
+                    f'{model._meta.verbose_name}: {cursor.rowcount}'
+                )
+
+    def merge_ingredients(self, cursor):
+        """
+        Повторы ингредиентов объединяются: связи с рецептами
+        переносятся на оставшийся ингредиент, а количество
+        повторяющихся в рецепте ингредиентов суммируется в строке,
+        которая останется после удаления повторов.
+        """
+        ingredient = column(RecipeIngredients, 'ingredient_id')
+        pk = column(Ingredient, 'id')
+        name = column(Ingredient, 'name')
+        unit = column(Ingredient, 'measurement_unit')
+        duplicates = duplicate_ids(Ingredient, ('name', 'measurement_unit'))
+        cursor.execute(
+            f'UPDATE {table(RecipeIngredients)} SET {ingredient} = '
+            f'(SELECT MIN(kept.{pk}) FROM {table(Ingredient)} kept, '
+            f'{table(Ingredient)} duplicate '
+            f'WHERE duplicate.{pk} = {table(RecipeIngredients)}.{ingredient} '
+            f'AND kept.{name} = duplicate.{name} '
+            f'AND kept.{unit} = duplicate.{unit}) '
+            f'WHERE {ingredient} IN ({duplicates})'
+        )
+        cursor.execute(
+            f'DELETE FROM {table(Ingredient)} WHERE {pk} IN '
+            f'(SELECT {pk} FROM ({duplicates}) duplicates)'
+        )
+        self.stdout.write(
+            f'{Ingredient._meta.verbose_name}: {cursor.rowcount}'
+        )
+        links = table(RecipeIngredients)
+        link_pk = column(RecipeIngredients, 'id')
+        recipe = column(RecipeIngredients, 'recipe_id')
+        amount = column(RecipeIngredients, 'amount')
+        cursor.execute(
+            f'UPDATE {links} SET {amount} = '
+            f'(SELECT SUM(other.{amount}) FROM {links} other '
+            f'WHERE other.{recipe} = {links}.{recipe} '
+            f'AND other.{ingredient} = {links}.{ingredient}) '
+            f'WHERE {link_pk} IN (SELECT MIN({link_pk}) FROM {links} '
+            f'GROUP BY {recipe}, {ingredient} HAVING COUNT(*) > 1)'
+        )
+
+    def rename_recipes(self):
+        """Рецепты автора с одинаковым названием получают суффикс с id."""
+        max_length = Recipe._meta.get_field('name').max_length
+        groups = Recipe.objects.values('author', 'name').order_by().annotate(
+            keep=Min('pk'), total=Count('pk')
+        ).filter(total__gt=1)
+        renamed = 0
+        for group in groups:
+            for recipe in Recipe.objects.filter(
+                author=group['author'], name=group['name']
+            ).exclude(pk=group['keep']).order_by().values('pk', 'name'):
+                self.rename(recipe, max_length)
+                renamed += 1
+        self.stdout.write(f'{Recipe._meta.verbose_name}: {renamed}')
+
+    def rename(self, recipe, max_length):
+        suffix = f' ({recipe["pk"]})'
+        Recipe.objects.filter(pk=recipe['pk']).update(
+            name=recipe['name'][:max_length - len(suffix)] + suffix
+        )
@@ -1,7 +1,13 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import EmptyResultSet
 from django.db import models
-from django.db.models import Sum
+from django.db.models import (BooleanField, Exists, F, OuterRef, Prefetch, Sum,
+                              Value, Window)
+from django.db.models.functions import RowNumber
+from users.models import CounterFieldsMixin, Follow
 
+from .indexes import SearchGinIndex
 from .validators import SlugValidator, min_amount
 
 User = get_user_model()
@@ -9,17 +15,19 @@ User = get_user_model()
 
 class Ingredient(models.Model):
     """Модель ингредиента."""
-    name = models.CharField(max_length=200)
+    name = models.CharField(max_length=200, db_index=True)
     measurement_unit = models.CharField(max_length=200)
 
     def __str__(self):
         return self.name
 
     class Meta:
-        models.UniqueConstraint(
-            fields=['name', 'measurement_unit'],
-            name='unique_ingredient_pair'
-        )
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_pair'
+            )
+        ]
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
 
@@ -39,7 +47,69 @@ class Tag(models.Model):
         verbose_name_plural = 'Теги'
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов рецептов с предзагрузкой связанных данных."""
+
+    @staticmethod
+    def relation_prefetches():
+        """
+        id тегов и ингредиенты с количеством.
+        Сами теги и ингредиенты берутся из справочника в памяти.
+        """
+        tags = RecipeTags.objects.only('recipe_id', 'tag_id')
+        return Prefetch('tags_list', queryset=tags), 'ingredients_num'
+
+    def with_relations(self):
+        """Загрузка автора, тегов и ингредиентов с количеством."""
+        return self.select_related('author').prefetch_related(
+            *self.relation_prefetches()
+        )
+
+    def with_user_flags(self, user):
+        """
+        Аннотация флагов избранного, списка покупок и подписки
+        на автора для текущего пользователя.
+        """
+        if not user.is_authenticated:
+            false = Value(False, output_field=BooleanField())
+            return self.annotate(is_favorited=false,
+                                 is_in_shopping_cart=false,
+                                 author_is_subscribed=false)
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(Cart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            author_is_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('author')))
+        )
+
+    def latest_per_author(self, limit=None):
+        """
+        Последние рецепты каждого автора, не больше limit на автора.
+        Отбор выполняется одним запросом с оконной функцией.
+        """
+        if limit is None:
+            return self
+        ranked = self.annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('author')],
+            order_by=[F('pub_date').desc(), F('pk').desc()]
+        )).order_by()
+        try:
+            sql, params = ranked.query.sql_with_params()
+        except EmptyResultSet:
+            # Например, пустой список авторов в author__in.
+            return self.none()
+        return self.model.objects.raw(
+            f'SELECT * FROM ({sql}) ranked '
+            f'WHERE ranked.row_number <= %s '
+            f'ORDER BY ranked.row_number',
+            params + (limit,)
+        )
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     """Модель рецепта."""
     author = models.ForeignKey(User,
                                on_delete=models.CASCADE,
@@ -54,17 +124,39 @@ class Recipe(models.Model):
         null=False,
         default=None
     )
+    image_renditions_ready = models.BooleanField(default=False)
     cooking_time = models.IntegerField(validators=[min_amount])
     pub_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    favorites_count = models.PositiveIntegerField(
+        'Добавлено в избранное', default=0
+    )
+    carts_count = models.PositiveIntegerField(
+        'Добавлено в список покупок', default=0
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    counter_fields = ('favorites_count', 'carts_count')
+
+    objects = RecipeQuerySet.as_manager()
 
     def __str__(self):
         return self.name
 
     class Meta():
-        models.UniqueConstraint(
-            fields=['author', 'name'],
-            name='unique_recipe_pair'
-        )
+        constraints = [
+            models.UniqueConstraint(
+                fields=['author', 'name'],
+                name='unique_recipe_pair'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['-pub_date'], name='recipe_pub_date_idx'),
+            models.Index(fields=['-favorites_count', '-pub_date'],
+                         name='recipe_popular_idx'),
+            SearchGinIndex(fields=['search_vector'],
+                           name='recipe_search_idx'),
+        ]
         ordering = ['-pub_date']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
@@ -80,25 +172,22 @@ class RecipeIngredients(models.Model):
                                   related_name='ingredients_num')
     amount = models.IntegerField(validators=[min_amount])
 
-    def form_shopping_list(user):
-        text = 'Список покупок:'
-        ingredients = RecipeIngredients.objects.filter(
+    def shopping_list(user):
+        """Суммарное количество ингредиентов из списка покупок."""
+        return RecipeIngredients.objects.filter(
             recipe_id__cart__user=user
-        ).values('ingredient_id__name',
-                 'ingredient_id__measurement_unit'
-                 ).annotate(amount=Sum('amount'))
-        for i in ingredients:
-            text += (
-                f"\n{i['ingredient_id__name']} - "
-                f"{i['amount']} {i['ingredient_id__measurement_unit']}"
-            )
-        return text
+        ).values(
+            name=F('ingredient_id__name'),
+            measurement_unit=F('ingredient_id__measurement_unit')
+        ).annotate(amount=Sum('amount')).order_by('name', 'measurement_unit')
 
     class Meta():
-        models.UniqueConstraint(
-            fields=['ingredient_id', 'recipe_id'],
-            name='unique_recipeingredients_pair'
-        )
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe_id', 'ingredient_id'],
+                name='unique_recipeingredients_pair'
+            )
+        ]
         verbose_name = 'Рецепты и ингредиенты'
         verbose_name_plural = verbose_name
 
@@ -113,6 +202,12 @@ class RecipeTags(models.Model):
                                   related_name='tags_list')
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe_id', 'tag_id'],
+                name='unique_recipetags_pair'
+            )
+        ]
         verbose_name = 'Рецепты и теги'
         verbose_name_plural = verbose_name
 
@@ -131,10 +226,12 @@ class Favorite(models.Model):
     )
 
     class Meta():
-        models.UniqueConstraint(
-            fields=['user', 'recipe'],
-            name='unique_favorite_pair'
-        )
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_favorite_pair'
+            )
+        ]
         verbose_name = 'Избранное'
         verbose_name_plural = verbose_name
 
@@ -153,9 +250,11 @@ class Cart(models.Model):
     )
 
     class Meta():
-        models.UniqueConstraint(
-            fields=['user', 'recipe'],
-            name='unique_cart_pair'
-        )
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_cart_pair'
+            )
+        ]
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Список покупок'
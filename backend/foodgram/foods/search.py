@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connections
+from django.db.models import (Case, F, FloatField, OuterRef, Q, Subquery,
+                              Value, When)
+
+from .models import Recipe, RecipeIngredients
+
+
+def is_supported(using):
+    """Полнотекстовый поиск доступен только в PostgreSQL."""
+    return connections[using].vendor == 'postgresql'
+
+
+def search_vector():
+    """
+    Вектор рецепта: название важнее описания,
+    названия ингредиентов учитываются с наименьшим весом.
+    """
+    config = settings.SEARCH_CONFIG
+    ingredients = RecipeIngredients.objects.filter(
+        recipe_id=OuterRef('pk')
+    ).values('recipe_id').annotate(
+        names=StringAgg('ingredient_id__name', ' ')
+    ).values('names')
+    return (SearchVector('name', weight='A', config=config)
+            + SearchVector('text', weight='B', config=config)
+            + SearchVector(Subquery(ingredients), weight='C', config=config))
+
+
+def update_search_vectors(recipes):
+    """Пересчет поисковых векторов рецептов из набора запросов."""
+    if not is_supported(recipes.db):
+        return 0
+    return recipes.update(search_vector=search_vector())
+
+
+def case_variants(query):
+    """
+    Варианты регистра запроса. В SQLite icontains не учитывает
+    регистр только для латиницы, поэтому для кириллицы
+    проверяются строчное, прописное и написание с заглавной буквы.
+    """
+    if query.isascii():
+        return [query]
+    return list(dict.fromkeys((query, query.lower(), query.upper(),
+                               query.capitalize())))
+
+
+def matches_any(field, variants):
+    condition = Q()
+    for variant in variants:
+        condition |= Q(**{f'{field}__icontains': variant})
+    return condition
+
+
+def search_recipes(queryset, query):
+    """
+    Поиск рецептов с сортировкой по релевантности.
+    Без PostgreSQL используется поиск по подстроке,
+    совпадения в названии выше остальных.
+    """
+    if is_supported(queryset.db):
+        search_query = SearchQuery(query, config=settings.SEARCH_CONFIG)
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-rank', '-pub_date', '-pk')
+    variants = case_variants(query)
+    matches = Recipe.objects.filter(
+        matches_any('name', variants)
+        | matches_any('text', variants)
+        | matches_any('ingredients__name', variants)
+    ).values('pk')
+    return queryset.filter(pk__in=matches).annotate(
+        rank=Case(When(matches_any('name', variants), then=Value(1.0)),
+                  default=Value(0.0), output_field=FloatField())
+    ).order_by('-rank', '-pub_date', '-pk')
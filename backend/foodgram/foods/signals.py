@@ -0,0 +1,170 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from users.models import Follow
+
+from . import cache, search
+from .counters import RECIPE_COUNTERS, change_counter, suspend_counters
+from .models import (Cart, Favorite, Ingredient, Recipe, RecipeIngredients,
+                     RecipeTags, Tag)
+
+User = get_user_model()
+
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+relations_suspended = ContextVar('relations_suspended', default=False)
+
+
+@contextmanager
+def suspend_relation_signals():
+    """
+    Отключение обработчиков изменения ингредиентов и тегов рецепта,
+    избранного и списков покупок, когда вызывающий код обновляет
+    рецепт и кэши сам, один раз.
+    """
+    token = relations_suspended.set(True)
+    try:
+        yield
+    finally:
+        relations_suspended.reset(token)
+
+
+@receiver([post_save, post_delete], sender=Cart)
+def cart_changed(sender, instance, **kwargs):
+    if relations_suspended.get():
+        return
+    cache.invalidate_shopping_lists([instance.user_id])
+
+
+@receiver([post_save, post_delete], sender=Cart)
+@receiver([post_save, post_delete], sender=Favorite)
+@receiver([post_save, post_delete], sender=Follow)
+def user_state_changed(sender, instance, **kwargs):
+    if relations_suspended.get():
+        return
+    cache.invalidate_user_states([instance.user_id])
+
+
+@receiver(post_save, sender=Cart)
+@receiver(post_save, sender=Favorite)
+def recipe_counter_increment(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id,
+                       RECIPE_COUNTERS[sender], 1)
+
+
+@receiver(post_delete, sender=Cart)
+@receiver(post_delete, sender=Favorite)
+def recipe_counter_decrement(sender, instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id,
+                   RECIPE_COUNTERS[sender], -1)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    search.update_search_vectors(Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredients)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    if relations_suspended.get():
+        return
+    cache.invalidate_recipe_shopping_lists(instance.recipe_id_id)
+    touch_recipe(instance.recipe_id_id, reindex=True)
+
+
+@receiver([post_save, post_delete], sender=RecipeTags)
+def recipe_tags_changed(sender, instance, **kwargs):
+    if relations_suspended.get():
+        return
+    touch_recipe(instance.recipe_id_id)
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    cache.invalidate_all_shopping_lists()
+    cache.invalidate_catalogue(Ingredient)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, **kwargs):
+    if not created:
+        search.update_search_vectors(
+            Recipe.objects.filter(ingredients=instance)
+        )
+
+
+@receiver(post_save, sender=User)
+def author_saved(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Данные автора входят в кэшированные фрагменты его рецептов,
+    поэтому при их изменении рецепты получают новую версию.
+    """
+    if created or (update_fields is not None
+                   and not AUTHOR_FIELDS.intersection(update_fields)):
+        return
+    Recipe.objects.filter(author_id=instance.pk).update(
+        updated_at=timezone.now()
+    )
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    cache.invalidate_catalogue(Tag)
+
+
+def touch_recipe(recipe_id, reindex=False):
+    """
+    Обновление времени изменения рецепта при правке его связей.
+    При изменении ингредиентов тем же запросом пересчитывается
+    поисковый вектор.
+    """
+    recipes = Recipe.objects.filter(pk=recipe_id)
+    fields = {'updated_at': timezone.now()}
+    if reindex and search.is_supported(recipes.db):
+        fields['search_vector'] = search.search_vector()
+    recipes.update(**fields)
+
+
+@transaction.atomic
+def delete_recipes(recipes):
+    """
+    Удаление рецептов. Каскадно удаляемые избранное, списки покупок,
+    ингредиенты и теги не обрабатываются построчно: счетчики авторов
+    и кэши пользователей обновляются один раз.
+    """
+    recipe_ids = list(recipes.values_list('pk', flat=True))
+    cart_users = set(Cart.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('user_id', flat=True))
+    favorite_users = set(Favorite.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('user_id', flat=True))
+    authors = Recipe.objects.filter(pk__in=recipe_ids).values(
+        'author_id'
+    ).order_by().annotate(total=Count('pk'))
+    authors = [(row['author_id'], row['total']) for row in authors]
+    for author_id, total in authors:
+        change_counter(User, author_id, 'recipes_count', -total)
+    # Кэши сбрасываются после фиксации транзакции, то есть после удаления.
+    cache.invalidate_shopping_lists(cart_users)
+    cache.invalidate_user_states(cart_users | favorite_users)
+    with suspend_counters(), suspend_relation_signals():
+        return Recipe.objects.filter(pk__in=recipe_ids).delete()
@@ -0,0 +1,80 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from users.models import Follow
+
+from .models import Cart, Favorite, Ingredient, Recipe, RecipeIngredients
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN для PostgreSQL')
+class IndexUsageTest(TestCase):
+    """Горячие выборки идут по индексам, а не полным просмотром."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author = (
+            User.objects.create_user(
+                email=f'{name}@example.com', username=name,
+                password='password', first_name=name, last_name=name
+            )
+            for name in ('user', 'author')
+        )
+        cls.ingredient = Ingredient.objects.create(name='Соль',
+                                                   measurement_unit='г')
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Текст',
+            image='recipes/images/recipe.png', cooking_time=1
+        )
+
+    def setUp(self):
+        # На пустых таблицах планировщик выбирает полный просмотр.
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assert_uses_index(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+        self.assertNotIn('Seq Scan', plan)
+
+    def test_favorite_pair(self):
+        self.assert_uses_index(
+            Favorite.objects.filter(user=self.user, recipe=self.recipe),
+            'unique_favorite_pair'
+        )
+
+    def test_cart_pair(self):
+        self.assert_uses_index(
+            Cart.objects.filter(user=self.user, recipe=self.recipe),
+            'unique_cart_pair'
+        )
+
+    def test_recipe_ingredient_pair(self):
+        self.assert_uses_index(
+            RecipeIngredients.objects.filter(recipe_id=self.recipe,
+                                             ingredient_id=self.ingredient),
+            'unique_recipeingredients_pair'
+        )
+
+    def test_ingredient_name_prefix(self):
+        # Поиск по началу названия идет по индексу varchar_pattern_ops,
+        # который Django создает для db_index с суффиксом _like.
+        self.assert_uses_index(
+            Ingredient.objects.filter(name__startswith='Со'),
+            '_like'
+        )
+
+    def test_follow_pair(self):
+        self.assert_uses_index(
+            Follow.objects.filter(user=self.user, author=self.author),
+            'unique_follow_pair'
+        )
+
+    def test_recipes_by_pub_date(self):
+        self.assert_uses_index(
+            Recipe.objects.order_by('-pub_date')[:10],
+            'recipe_pub_date_idx'
+        )
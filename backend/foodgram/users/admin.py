@@ -7,7 +7,9 @@ from . import models
 
 class UserAdmin(admin.ModelAdmin):
     list_display = ('email', 'username',
-                    'first_name', 'last_name')
+                    'first_name', 'last_name',
+                    'recipes_count')
+    readonly_fields = ('recipes_count',)
     list_filter = ('username',
                    'email')
 
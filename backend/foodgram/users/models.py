@@ -2,12 +2,36 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 
-class User(AbstractUser):
+class CounterFieldsMixin:
+    """
+    Счетчики меняются только атомарными UPDATE с F(), поэтому
+    при сохранении существующего объекта они не записываются:
+    иначе загруженное в начале запроса значение затрет
+    параллельные изменения.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CounterFieldsMixin, AbstractUser):
     """Модель пользователя."""
     email = models.EmailField(unique=True, max_length=254)
     username = models.CharField(unique=True, max_length=150)
     first_name = models.CharField(max_length=150)
     last_name = models.CharField(max_length=150)
+    recipes_count = models.PositiveIntegerField('Рецептов', default=0)
+
+    counter_fields = ('recipes_count',)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -31,9 +55,11 @@ class Follow(models.Model):
     )
 
     class Meta():
-        models.UniqueConstraint(
-            fields=['user', 'author'],
-            name='unique_follow_pair'
-        )
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow_pair'
+            )
+        ]
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
@@ -1,6 +1,6 @@
 from django.contrib.auth import get_user_model
-from django.contrib.auth.models import AnonymousUser
 from djoser.serializers import UserSerializer
+from foods.cache import get_user_state
 from rest_framework import serializers
 
 User = get_user_model()
@@ -21,7 +21,6 @@ class CustomUserSerializer(UserSerializer):
                   )
 
     def get_is_subscribed(self, obj):
-        request_user = self.context.get('request').user
-        if type(request_user) == AnonymousUser:
-            return False
-        return request_user.follower.filter(author__exact=obj).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return obj.pk in get_user_state(self.context.get('request')).following
@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+User = get_user_model()
+
+
+class SubscriptionsTest(TestCase):
+    """Список подписок."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='user@example.com', username='user', password='password',
+            first_name='user', last_name='user'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_empty_page_with_recipes_limit(self):
+        response = self.client.get(
+            '/api/users/subscriptions/?recipes_limit=3'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])
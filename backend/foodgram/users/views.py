@@ -1,50 +1,81 @@
+from api.batch import BatchSerializer, apply_batch
 from api.paginator import CustomPaginator
-from api.serializers import FollowReturnSerializer, FollowSerializer
+from api.serializers import FollowReturnSerializer, get_recipes_limit
+from api.validators import (create_unique_pair, delete_unique_pair,
+                            raise_pair_error)
 from django.contrib.auth import get_user_model
+from django.db.models import BooleanField, Value
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from .models import Follow
+
 User = get_user_model()
 
 
 class CustomUserViewSet(UserViewSet):
     """Вьюсет для модели User"""
+    replica_reads = True
     pagination_class = CustomPaginator
+    cursor_ordering = ('pk',)
 
-    @action(detail=True, methods=['post', 'delete'])
+    @action(detail=True, methods=['post', 'delete'],
+            permission_classes=(IsAuthenticated,))
     def subscribe(self, request, id):
         """Подписка на автора."""
         current_user = request.user
+        limit = get_recipes_limit(request)
+        if request.method == 'DELETE':
+            if not delete_unique_pair(Follow, current_user, 'author', id):
+                get_object_or_404(User, pk=id)
+                raise_pair_error(Follow, 'missing')
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
         user_follow = get_object_or_404(User, pk=id)
-        seriailizer = FollowSerializer(data={'user': current_user.pk,
-                                             'author': user_follow.pk},
-                                       context={'request': request})
-        if seriailizer.is_valid(raise_exception=True):
-            if request.method == 'DELETE':
-                current_user.follower.filter(author=user_follow).delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
-
-            seriailizer.save()
-            return Response(seriailizer.data)
-        return Response(status=status.HTTP_400_BAD_REQUEST)
-
-    @action(detail=False, pagination_class=CustomPaginator)
+        if user_follow == current_user:
+            raise_pair_error(Follow, 'self')
+        create_unique_pair(Follow, current_user, 'author', user_follow.pk)
+        user_follow.is_subscribed = True
+        context = FollowReturnSerializer.get_context(request,
+                                                     [user_follow],
+                                                     limit)
+        return Response(FollowReturnSerializer(user_follow,
+                                               context=context).data)
+
+    @action(detail=False, methods=['post'],
+            permission_classes=(IsAuthenticated,))
+    def subscribe_batch(self, request):
+        """Массовая подписка на авторов и отписка от них."""
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        authors = set(User.objects.filter(
+            pk__in=data['add'] + data['remove']
+        ).values_list('pk', flat=True))
+        results = apply_batch(Follow, request.user, 'author', data,
+                              authors, {request.user.pk})
+        return Response({'results': results})
+
+    @action(detail=False, pagination_class=CustomPaginator,
+            permission_classes=(IsAuthenticated,))
     def subscriptions(self, request):
-        """Получение списка подписок."""
-        current_user = request.user
-        author_ids = current_user.follower.values_list('author', flat=True)
-        queryset = User.objects.filter(pk__in=author_ids)
+        """
+        Получение списка подписок.
+        Рецепты всех авторов страницы загружаются одним запросом.
+        """
+        limit = get_recipes_limit(request)
+        queryset = User.objects.filter(
+            following__user=request.user
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).order_by('pk')
         page = self.paginate_queryset(queryset)
-        if not page:
-            serializer = FollowReturnSerializer(queryset,
-                                                many=True,
-                                                context={'request': request})
-            return self.get_paginated_response(serializer.data)
-
+        context = FollowReturnSerializer.get_context(request, page, limit)
         serializer = FollowReturnSerializer(page,
                                             many=True,
-                                            context={'request': request})
+                                            context=context)
         return self.get_paginated_response(serializer.data)